@@ -4,16 +4,40 @@ BigQuery Usage Monitoring Tool
 データストレージとクエリ処理量の使用状況を監視するシステム
 """
 
+import argparse
+import calendar
+import csv
+import hashlib
+import itertools
 import json
+import random
+import re
+import signal
+import sqlite3
 import sys
+import threading
+import time
 import traceback
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple, TYPE_CHECKING
 from pathlib import Path
+from types import SimpleNamespace
 
-from google.cloud import bigquery
-from google.oauth2 import service_account
+# google-cloud系ライブラリは読み込みに時間がかかるため、使用する箇所で遅延インポートする
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+
+
+# 処理単位の状態
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+STATUS_TIMEOUT = "timeout"
+
+# 期限切れを表す例外（Python 3.10以前のas_completed/Future.result/QueryJob.resultは組み込みと別のTimeoutErrorを送出する）
+TIMEOUT_ERRORS = (TimeoutError, FuturesTimeoutError)
 
 
 @dataclass
@@ -25,6 +49,10 @@ class DatasetUsage:
     size_tb: float
     cost_usd: float
     cost_jpy: float
+    status: str = STATUS_OK
+    error_phase: Optional[str] = None
+    error: Optional[str] = None
+    elapsed_seconds: float = 0.0
 
 
 @dataclass
@@ -37,6 +65,42 @@ class UserQueryUsage:
     cost_jpy: float
 
 
+@dataclass
+class UnitError:
+    """処理単位（データセット・クエリ）の失敗情報"""
+    unit: str
+    phase: str
+    status: str
+    error: str
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"unit": self.unit, "phase": self.phase, "status": self.status, "error": self.error}
+
+
+class RunDeadline:
+    """実行全体の期限"""
+    
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+    
+    def remaining(self) -> Optional[float]:
+        """残り秒数（期限なしの場合はNone）"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    def expired(self) -> bool:
+        """期限を過ぎたか"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+    
+    def earliest(self, seconds: Optional[float]) -> Optional[float]:
+        """「今からseconds秒後」と全体期限の早い方（monotonic時刻、どちらもなければNone）"""
+        candidates = [value for value in (self.expires_at,) if value is not None]
+        if seconds is not None:
+            candidates.append(time.monotonic() + seconds)
+        return min(candidates) if candidates else None
+
+
 class ConfigurationManager:
     """設定管理クラス"""
     
@@ -59,23 +123,184 @@ class ConfigurationManager:
             print(traceback.format_exc(), file=sys.stderr, flush=True)
             sys.exit(101)
     
+    @staticmethod
+    def load_project_config(config_path: str, project_id: Optional[str] = None) -> Dict[str, Any]:
+        """設定ファイルを読み込み、単一プロジェクトを対象とするコマンド向けに1プロジェクト分の設定を取得"""
+        config = ConfigurationManager.load_config(config_path)
+        try:
+            return ConfigurationManager.select_project(config, project_id)
+        except ValueError as error:
+            print(f"設定エラー: {error}", file=sys.stderr, flush=True)
+            sys.exit(101)
+    
+    @staticmethod
+    def expand_projects(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """projects設定をプロジェクト毎の設定（共通設定を各プロジェクトの項目で上書き）に展開"""
+        if "projects" not in config:
+            return [config]
+        base_config = {key: value for key, value in config.items() if key != "projects"}
+        return [dict(base_config, **project_entry) for project_entry in config["projects"]]
+    
+    @staticmethod
+    def select_project(config: Dict[str, Any], project_id: Optional[str] = None) -> Dict[str, Any]:
+        """展開したプロジェクト毎の設定から1つを選択"""
+        project_configs = ConfigurationManager.expand_projects(config)
+        if project_id is None:
+            if len(project_configs) > 1:
+                raise ValueError("複数プロジェクトの設定では--projectで対象のプロジェクトを指定してください")
+            return project_configs[0]
+        for project_config in project_configs:
+            if project_config["project_id"] == project_id:
+                return project_config
+        raise ValueError(f"設定に存在しないプロジェクト: {project_id}")
+    
     @staticmethod
     def _validate_config(config: Dict[str, Any]) -> None:
         """設定内容の検証"""
         essential_fields = ["project_id", "region", "key_file", "datasets"]
-        missing_fields = [field for field in essential_fields if field not in config]
+        organization = config.get("organization")
+        if organization is not None:
+            if not isinstance(organization, dict):
+                raise ValueError("organizationは組織モードの設定で指定してください（例: {\"enabled\": true}）")
+            for filter_key in ("projects", "datasets"):
+                filter_values = organization.get(filter_key)
+                if filter_values is not None and (not isinstance(filter_values, list) or not filter_values
+                                                  or not all(isinstance(value, str) and value for value in filter_values)):
+                    raise ValueError(f"organization.{filter_key}は名前のリストで指定してください")
+            if organization.get("enabled"):
+                if "projects" in config:
+                    raise ValueError("organizationとprojectsは同時に指定できません")
+                if config.get("query", {}).get("incremental"):
+                    raise ValueError("organizationとquery.incrementalは同時に指定できません")
+                # 組織モードではデータセットをorganization.datasetsで絞り込む（省略時は全データセット）
+                essential_fields = ["project_id", "region", "key_file"]
+        if "projects" in config:
+            projects = config["projects"]
+            if not isinstance(projects, list) or not projects or not all(isinstance(entry, dict) for entry in projects):
+                raise ValueError("projectsはプロジェクト毎の設定のリストで指定してください")
+            for index, project_config in enumerate(ConfigurationManager.expand_projects(config)):
+                missing_fields = [field for field in essential_fields if field not in project_config]
+                if missing_fields:
+                    raise ValueError(f"projects[{index}]の必須設定項目が不足: {', '.join(missing_fields)}")
+            project_ids = [entry["project_id"] for entry in projects]
+            duplicated_ids = sorted({project_id for project_id in project_ids if project_ids.count(project_id) > 1})
+            if duplicated_ids:
+                raise ValueError(f"projectsのproject_idが重複: {', '.join(duplicated_ids)}")
+        else:
+            missing_fields = [field for field in essential_fields if field not in config]
+            if missing_fields:
+                raise ValueError(f"必須設定項目が不足: {', '.join(missing_fields)}")
+        
+        fanout_executor = config.get("fanout", {}).get("executor")
+        if fanout_executor is not None and fanout_executor not in ("thread", "process"):
+            raise ValueError(f"fanout.executorの値が不正: {fanout_executor}（thread, process）")
+        fanout_workers = config.get("fanout", {}).get("max_workers")
+        if fanout_workers is not None and (not isinstance(fanout_workers, int) or fanout_workers < 1):
+            raise ValueError(f"fanout.max_workersは1以上の整数で指定してください: {fanout_workers}")
+        
+        # 共通設定に加え、プロジェクト毎の上書きを反映した設定も同じ項目を検証する
+        ConfigurationManager._validate_sections(config)
+        if "projects" in config:
+            for index, project_config in enumerate(ConfigurationManager.expand_projects(config)):
+                try:
+                    ConfigurationManager._validate_sections(project_config)
+                except ValueError as error:
+                    raise ValueError(f"projects[{index}]: {error}") from error
+    
+    @staticmethod
+    def _validate_sections(config: Dict[str, Any]) -> None:
+        """プロジェクト毎に指定できる設定（storage/run/retry/query/history/daemon）の検証"""
+        storage_engine = config.get("storage", {}).get("engine")
+        if storage_engine is not None and storage_engine not in ("table_storage", "per_table"):
+            raise ValueError(f"storage.engineの値が不正: {storage_engine}")
+        
+        max_workers = config.get("storage", {}).get("max_workers")
+        if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+            raise ValueError(f"storage.max_workersは1以上の整数で指定してください: {max_workers}")
+        
+        max_concurrent_datasets = config.get("storage", {}).get("max_concurrent_datasets")
+        if max_concurrent_datasets is not None and (
+                not isinstance(max_concurrent_datasets, int) or max_concurrent_datasets < 1):
+            raise ValueError(f"storage.max_concurrent_datasetsは1以上の整数で指定してください: {max_concurrent_datasets}")
+        
+        deadline_seconds = config.get("run", {}).get("deadline_seconds")
+        if deadline_seconds is not None and (not isinstance(deadline_seconds, (int, float)) or deadline_seconds <= 0):
+            raise ValueError(f"run.deadline_secondsは正の数で指定してください: {deadline_seconds}")
+        
+        retry_failed_rounds = config.get("run", {}).get("retry_failed_rounds")
+        if retry_failed_rounds is not None and (not isinstance(retry_failed_rounds, int) or retry_failed_rounds < 0):
+            raise ValueError(f"run.retry_failed_roundsは0以上の整数で指定してください: {retry_failed_rounds}")
+        
+        retry_config = config.get("retry", {})
+        max_attempts = retry_config.get("max_attempts")
+        if max_attempts is not None and (not isinstance(max_attempts, int) or max_attempts < 1):
+            raise ValueError(f"retry.max_attemptsは1以上の整数で指定してください: {max_attempts}")
+        for retry_key in ("initial_backoff_seconds", "max_backoff_seconds", "multiplier", "per_call_timeout_seconds"):
+            retry_value = retry_config.get(retry_key)
+            if retry_value is not None and (not isinstance(retry_value, (int, float)) or retry_value <= 0):
+                raise ValueError(f"retry.{retry_key}は正の数で指定してください: {retry_value}")
+        
+        align_seconds = config.get("query", {}).get("align_seconds")
+        if align_seconds is not None and (not isinstance(align_seconds, int) or align_seconds <= 0):
+            raise ValueError(f"query.align_secondsは正の整数で指定してください: {align_seconds}")
+        
+        maximum_bytes_billed = config.get("query", {}).get("maximum_bytes_billed")
+        if maximum_bytes_billed is not None and (not isinstance(maximum_bytes_billed, int) or maximum_bytes_billed <= 0):
+            raise ValueError(f"query.maximum_bytes_billedは正の整数で指定してください: {maximum_bytes_billed}")
         
-        if missing_fields:
-            raise ValueError(f"必須設定項目が不足: {', '.join(missing_fields)}")
+        min_split_seconds = config.get("query", {}).get("min_split_seconds")
+        if min_split_seconds is not None and (not isinstance(min_split_seconds, int) or min_split_seconds < 60):
+            raise ValueError(f"query.min_split_secondsは60以上の整数で指定してください: {min_split_seconds}")
+        
+        for chunk_key in ("chunk_seconds", "max_concurrent_chunks"):
+            chunk_value = config.get("query", {}).get(chunk_key)
+            if chunk_value is not None and (not isinstance(chunk_value, int) or chunk_value < 0):
+                raise ValueError(f"query.{chunk_key}は0以上の整数で指定してください: {chunk_value}")
+        
+        backfill_days = config.get("history", {}).get("backfill_days")
+        if backfill_days is not None and (not isinstance(backfill_days, int)
+                                          or not 1 <= backfill_days <= QueryAnalyzer.JOBS_RETENTION_DAYS):
+            raise ValueError(f"history.backfill_daysは1〜{QueryAnalyzer.JOBS_RETENTION_DAYS}の整数で指定してください: "
+                             f"{backfill_days}")
+        
+        retention_days = config.get("history", {}).get("retention_days")
+        if retention_days is not None:
+            if not isinstance(retention_days, dict):
+                raise ValueError("history.retention_daysは階層毎の保持日数で指定してください（例: {\"raw\": 14}）")
+            for tier, tier_days in retention_days.items():
+                if tier not in HistoryStore.TIERS:
+                    raise ValueError(f"history.retention_daysの階層が不正: {tier}（{', '.join(HistoryStore.TIERS)}）")
+                if tier_days is not None and (not isinstance(tier_days, int) or tier_days <= 0):
+                    raise ValueError(f"history.retention_days.{tier}は正の整数またはnullで指定してください: {tier_days}")
+        
+        query_regions = config.get("query", {}).get("regions")
+        if query_regions is not None and (not isinstance(query_regions, list) or not query_regions
+                                          or not all(isinstance(region, str) and region for region in query_regions)):
+            raise ValueError("query.regionsはリージョン名のリストで指定してください（例: [\"us\", \"eu\"]）")
+        
+        windows = config.get("query", {}).get("windows")
+        if windows is not None:
+            if not isinstance(windows, list) or not windows:
+                raise ValueError("query.windowsは集計期間のリストで指定してください（例: [\"1h\", \"24h\", \"7d\"]）")
+            for window in windows:
+                QueryAnalyzer.parse_window(window)
+        
+        for interval_key in ("storage_interval_seconds", "query_interval_seconds"):
+            interval = config.get("daemon", {}).get(interval_key)
+            if interval is not None and (not isinstance(interval, (int, float)) or interval <= 0):
+                raise ValueError(f"daemon.{interval_key}は正の数で指定してください: {interval}")
 
 
 class BigQueryClientFactory:
     """BigQueryクライアント生成クラス"""
     
     @staticmethod
-    def create_client(key_file_path: str, project_id: str) -> bigquery.Client:
+    def create_client(key_file_path: str, project_id: str) -> "bigquery.Client":
         """認証情報を使用してBigQueryクライアントを生成"""
         try:
+            from google.cloud import bigquery
+            from google.oauth2 import service_account
+            
             credentials = service_account.Credentials.from_service_account_file(key_file_path)
             return bigquery.Client(credentials=credentials, project=project_id)
         except Exception as error:
@@ -84,6 +309,421 @@ class BigQueryClientFactory:
             sys.exit(102)
 
 
+class ApiInstrumentation:
+    """BigQuery API呼び出しの計測値（呼び出し回数・レイテンシ分布・リトライ・課金バイト数）"""
+    
+    # レイテンシヒストグラムの上限値（秒）
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = {}
+        self._bytes_billed = 0
+    
+    def _method_stats(self, method: str) -> Dict[str, Any]:
+        stats = self._methods.get(method)
+        if stats is None:
+            stats = {
+                "calls": 0,
+                "errors": 0,
+                "retries": 0,
+                "total_seconds": 0.0,
+                "max_seconds": 0.0,
+                "histogram": [0] * (len(self.LATENCY_BUCKETS) + 1),
+            }
+            self._methods[method] = stats
+        return stats
+    
+    def record_call(self, method: str, elapsed_seconds: float, failed: bool = False) -> None:
+        """API呼び出し1回分の結果を記録"""
+        bucket_index = len(self.LATENCY_BUCKETS)
+        for index, upper_bound in enumerate(self.LATENCY_BUCKETS):
+            if elapsed_seconds <= upper_bound:
+                bucket_index = index
+                break
+        
+        with self._lock:
+            stats = self._method_stats(method)
+            stats["calls"] += 1
+            stats["errors"] += 1 if failed else 0
+            stats["total_seconds"] += elapsed_seconds
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed_seconds)
+            stats["histogram"][bucket_index] += 1
+    
+    def record_retry(self, method: str) -> None:
+        """リトライ1回を記録"""
+        with self._lock:
+            self._method_stats(method)["retries"] += 1
+    
+    def record_bytes_billed(self, bytes_billed: int) -> None:
+        """クエリジョブの課金バイト数を記録"""
+        with self._lock:
+            self._bytes_billed += bytes_billed
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """計測値をレポート出力用の辞書に変換"""
+        with self._lock:
+            methods = {}
+            for method, stats in sorted(self._methods.items()):
+                # Prometheusと同様に上限値以下の累積件数で表す
+                histogram = {}
+                cumulative_count = 0
+                for upper_bound, count in zip(self.LATENCY_BUCKETS, stats["histogram"]):
+                    cumulative_count += count
+                    histogram[f"le_{upper_bound:g}"] = cumulative_count
+                histogram["le_inf"] = cumulative_count + stats["histogram"][-1]
+                methods[method] = {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "retries": stats["retries"],
+                    "total_seconds": round(stats["total_seconds"], 6),
+                    "avg_seconds": round(stats["total_seconds"] / stats["calls"], 6) if stats["calls"] else 0.0,
+                    "max_seconds": round(stats["max_seconds"], 6),
+                    "latency_histogram": histogram,
+                }
+            return {
+                "methods": methods,
+                "total_bytes_billed": self._bytes_billed,
+            }
+
+
+class InstrumentedQueryJob:
+    """完了待ちと課金バイト数を計測するクエリジョブのラッパー"""
+    
+    def __init__(self, job: Any, instrumentation: ApiInstrumentation):
+        self._job = job
+        self._instrumentation = instrumentation
+    
+    def result(self, *args, **kwargs):
+        started_at = time.monotonic()
+        try:
+            rows = self._job.result(*args, **kwargs)
+        except Exception:
+            self._instrumentation.record_call("query.result", time.monotonic() - started_at, failed=True)
+            raise
+        self._instrumentation.record_call("query.result", time.monotonic() - started_at)
+        self._instrumentation.record_bytes_billed(getattr(self._job, "total_bytes_billed", None) or 0)
+        return rows
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._job, name)
+
+
+class InstrumentedClient:
+    """BigQueryクライアントのラッパー（API呼び出し毎の計測）"""
+    
+    def __init__(self, client: "bigquery.Client", instrumentation: ApiInstrumentation):
+        self._client = client
+        self.instrumentation = instrumentation
+    
+    def _timed_call(self, method: str, *args, **kwargs) -> Any:
+        started_at = time.monotonic()
+        try:
+            result = getattr(self._client, method)(*args, **kwargs)
+        except Exception:
+            self.instrumentation.record_call(method, time.monotonic() - started_at, failed=True)
+            raise
+        self.instrumentation.record_call(method, time.monotonic() - started_at)
+        return result
+    
+    def get_dataset(self, *args, **kwargs) -> Any:
+        return self._timed_call("get_dataset", *args, **kwargs)
+    
+    def get_table(self, *args, **kwargs) -> Any:
+        return self._timed_call("get_table", *args, **kwargs)
+    
+    def list_tables(self, *args, **kwargs) -> List[Any]:
+        # ページングを含めた全件取得までを1回として計測する
+        started_at = time.monotonic()
+        try:
+            tables = list(self._client.list_tables(*args, **kwargs))
+        except Exception:
+            self.instrumentation.record_call("list_tables", time.monotonic() - started_at, failed=True)
+            raise
+        self.instrumentation.record_call("list_tables", time.monotonic() - started_at)
+        return tables
+    
+    def query(self, *args, **kwargs) -> InstrumentedQueryJob:
+        return InstrumentedQueryJob(self._timed_call("query", *args, **kwargs), self.instrumentation)
+    
+    def __getattr__(self, name: str) -> Any:
+        # 計測対象外のメソッド・属性はそのまま委譲
+        return getattr(self._client, name)
+
+
+class RetryPolicy:
+    """一時的なエラーに対する再試行方針（ジッター付き指数バックオフ）"""
+    
+    # 再試行対象のHTTPステータスとエラー理由
+    RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+    RETRYABLE_REASONS = {"rateLimitExceeded", "backendError", "internalError", "jobRateLimitExceeded"}
+    RETRYABLE_ERROR_NAMES = {"ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "ChunkedEncodingError"}
+    
+    DEFAULT_MAX_ATTEMPTS = 5
+    DEFAULT_INITIAL_BACKOFF_SECONDS = 0.5
+    DEFAULT_MAX_BACKOFF_SECONDS = 30.0
+    DEFAULT_MULTIPLIER = 2.0
+    DEFAULT_PER_CALL_TIMEOUT_SECONDS = 60.0
+    
+    def __init__(self, retry_config: Optional[Dict[str, Any]] = None):
+        retry_config = retry_config or {}
+        self.max_attempts = retry_config.get("max_attempts", self.DEFAULT_MAX_ATTEMPTS)
+        self.initial_backoff_seconds = retry_config.get("initial_backoff_seconds", self.DEFAULT_INITIAL_BACKOFF_SECONDS)
+        self.max_backoff_seconds = retry_config.get("max_backoff_seconds", self.DEFAULT_MAX_BACKOFF_SECONDS)
+        self.multiplier = retry_config.get("multiplier", self.DEFAULT_MULTIPLIER)
+        self.per_call_timeout_seconds = retry_config.get(
+            "per_call_timeout_seconds", self.DEFAULT_PER_CALL_TIMEOUT_SECONDS
+        )
+    
+    def is_retryable(self, error: Exception) -> bool:
+        """再試行すべきエラーかを判定"""
+        if getattr(error, "code", None) in self.RETRYABLE_STATUS_CODES:
+            return True
+        for detail in getattr(error, "errors", None) or []:
+            if isinstance(detail, dict) and detail.get("reason") in self.RETRYABLE_REASONS:
+                return True
+        return type(error).__name__ in self.RETRYABLE_ERROR_NAMES
+    
+    def backoff_seconds(self, attempt: int) -> float:
+        """attempt回目の失敗後の待機時間（0〜上限の一様乱数によるフルジッター）"""
+        ceiling = min(self.max_backoff_seconds, self.initial_backoff_seconds * (self.multiplier ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+    
+    def call_timeout(self, deadline: RunDeadline) -> float:
+        """1回のAPI呼び出しに与えるタイムアウト（実行期限の残り時間を超えない）"""
+        remaining = deadline.remaining()
+        if remaining is None:
+            return self.per_call_timeout_seconds
+        if remaining <= 0:
+            raise TimeoutError("実行期限を超過したためAPI呼び出しを行いません")
+        return min(self.per_call_timeout_seconds, remaining)
+    
+    @staticmethod
+    def wait_timeout(deadline: RunDeadline) -> Optional[float]:
+        """クエリジョブの完了待ちのタイムアウト（実行期限の残り時間のみで制限し、期限がなければ完了まで待つ）"""
+        remaining = deadline.remaining()
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError("実行期限を超過したためクエリジョブの完了を待ちません")
+        return remaining
+    
+    def execute(self, method: str, operation, deadline: RunDeadline,
+                instrumentation: Optional[ApiInstrumentation] = None, wait: bool = False) -> Any:
+        """operation(timeout)を再試行方針に従って実行（waitの場合はジョブの完了待ちとしてタイムアウトを決める）"""
+        attempt = 1
+        while True:
+            try:
+                return operation(self.wait_timeout(deadline) if wait else self.call_timeout(deadline))
+            except Exception as error:
+                if attempt >= self.max_attempts or not self.is_retryable(error):
+                    raise
+                wait_seconds = self.backoff_seconds(attempt)
+                remaining = deadline.remaining()
+                if remaining is not None and remaining <= wait_seconds:
+                    raise
+                print(f"{method}で一時的なエラー（{attempt}/{self.max_attempts}回目、{wait_seconds:.2f}秒後に再試行）: {error}",
+                      file=sys.stderr, flush=True)
+                if instrumentation is not None:
+                    instrumentation.record_retry(method)
+                time.sleep(wait_seconds)
+                attempt += 1
+
+
+class RetryingQueryJob:
+    """完了待ちを再試行方針に従って行うクエリジョブのラッパー（ジョブ自体が失敗した場合は投入し直す）"""
+    
+    def __init__(self, job: Any, client: "RetryingClient", query_args: Tuple[Any, ...] = (),
+                 query_kwargs: Optional[Dict[str, Any]] = None):
+        self._job = job
+        self._client = client
+        self._query_args = query_args
+        self._query_kwargs = query_kwargs or {}
+    
+    def result(self, timeout: Optional[float] = None, **kwargs):
+        # 長時間のスキャンも完了まで待つため、per_call_timeout_secondsは適用しない
+        return self._client.policy.execute(
+            "query.result",
+            lambda wait_timeout: self._wait(
+                min(value for value in (wait_timeout, timeout) if value is not None)
+                if wait_timeout is not None or timeout is not None else None,
+                **kwargs
+            ),
+            self._client.deadline,
+            self._client.instrumentation,
+            wait=True,
+        )
+    
+    def _wait(self, timeout: Optional[float], **kwargs):
+        """ジョブの完了を待つ（前回の待機でジョブが失敗していた場合は同じクエリを投入し直してから待つ）"""
+        if getattr(self._job, "error_result", None) is not None:
+            # 失敗したジョブの結果を再度待っても同じエラーになるため、新しいジョブとして投入する
+            print(f"クエリジョブ {getattr(self._job, 'job_id', '')} が失敗したため再投入します", file=sys.stderr, flush=True)
+            self._job = self._client.submit_query(*self._query_args, **self._query_kwargs)
+        return self._job.result(timeout=timeout, **kwargs)
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._job, name)
+
+
+class RetryingClient:
+    """BigQueryクライアントのラッパー（一時的なエラーの再試行と実行期限の適用）"""
+    
+    def __init__(self, client: "bigquery.Client", policy: RetryPolicy, deadline: Optional[RunDeadline] = None,
+                 instrumentation: Optional[ApiInstrumentation] = None):
+        self._client = client
+        self.policy = policy
+        self.deadline = deadline or RunDeadline()
+        self.instrumentation = instrumentation
+    
+    @staticmethod
+    def _caller_expires_at(timeout: Optional[float]) -> Optional[float]:
+        """呼び出し元が指定したタイムアウトの期限（monotonic時刻、指定がなければNone）"""
+        return None if timeout is None else time.monotonic() + timeout
+    
+    @staticmethod
+    def _bounded_timeout(call_timeout: float, expires_at: Optional[float]) -> float:
+        """1回の呼び出しのタイムアウトを呼び出し元の期限までに制限（再試行を含めて期限を超えない）"""
+        if expires_at is None:
+            return call_timeout
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("処理期限を超過したためAPI呼び出しを行いません")
+        return min(call_timeout, remaining)
+    
+    def _call(self, method: str, *args, **kwargs) -> Any:
+        # ライブラリ既定の再試行（DEFAULT_RETRY）は無効にし、再試行と実行期限はこの方針で管理する
+        kwargs.setdefault("retry", None)
+        expires_at = self._caller_expires_at(kwargs.pop("timeout", None))
+        return self.policy.execute(
+            method,
+            lambda call_timeout: getattr(self._client, method)(
+                *args, timeout=self._bounded_timeout(call_timeout, expires_at), **kwargs
+            ),
+            self.deadline,
+            self.instrumentation,
+        )
+    
+    def get_dataset(self, *args, **kwargs) -> Any:
+        return self._call("get_dataset", *args, **kwargs)
+    
+    def get_table(self, *args, **kwargs) -> Any:
+        return self._call("get_table", *args, **kwargs)
+    
+    def list_tables(self, *args, **kwargs) -> List[Any]:
+        # ページの途中で失敗した場合は一覧取得をやり直す
+        kwargs.setdefault("retry", None)
+        expires_at = self._caller_expires_at(kwargs.pop("timeout", None))
+        return self.policy.execute(
+            "list_tables",
+            lambda call_timeout: list(self._client.list_tables(
+                *args, timeout=self._bounded_timeout(call_timeout, expires_at), **kwargs
+            )),
+            self.deadline,
+            self.instrumentation,
+        )
+    
+    def query(self, *args, **kwargs) -> RetryingQueryJob:
+        return RetryingQueryJob(self.submit_query(*args, **kwargs), self, args, kwargs)
+    
+    def submit_query(self, *args, **kwargs) -> Any:
+        """クエリジョブを投入（完了待ちの再試行は行わない）"""
+        return self._call("query", *args, **kwargs)
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+class TableMetadataCache:
+    """テーブルメタデータのローカルキャッシュ（SQLite）"""
+    
+    def __init__(self, cache_path: str, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        
+        cache_file = Path(cache_path)
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(cache_file), check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS table_metadata (
+                    project_id TEXT NOT NULL,
+                    dataset_id TEXT NOT NULL,
+                    table_id TEXT NOT NULL,
+                    num_bytes INTEGER NOT NULL,
+                    created REAL,
+                    modified REAL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (project_id, dataset_id, table_id)
+                ) WITHOUT ROWID
+                """
+            )
+    
+    def load(self, project_id: str, dataset_id: str) -> Dict[str, Tuple[int, Optional[float], float]]:
+        """データセット内のキャッシュ済みテーブル情報を取得（table_id → (num_bytes, created, fetched_at)）"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT table_id, num_bytes, created, fetched_at FROM table_metadata "
+                "WHERE project_id = ? AND dataset_id = ?",
+                (project_id, dataset_id),
+            ).fetchall()
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+    
+    def is_fresh(self, entry: Optional[Tuple[int, Optional[float], float]], created: Optional[float],
+                 now: float) -> bool:
+        """キャッシュエントリが再取得不要かを判定"""
+        if entry is None:
+            return False
+        _, cached_created, fetched_at = entry
+        # 作成日時が変わっていればテーブルが再作成されている
+        if cached_created != created:
+            return False
+        return now - fetched_at < self.ttl_seconds
+    
+    def store(self, project_id: str, dataset_id: str, entries: List[Tuple[str, int, Optional[float], Optional[float]]],
+              live_table_ids: List[str], fetched_at: float) -> None:
+        """取得結果を保存し、存在しなくなったテーブルを削除"""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO table_metadata "
+                "(project_id, dataset_id, table_id, num_bytes, created, modified, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (project_id, dataset_id, table_id, num_bytes, created, modified, fetched_at)
+                    for table_id, num_bytes, created, modified in entries
+                ],
+            )
+            cached_ids = {
+                row[0] for row in self._connection.execute(
+                    "SELECT table_id FROM table_metadata WHERE project_id = ? AND dataset_id = ?",
+                    (project_id, dataset_id),
+                )
+            }
+            removed_ids = cached_ids - set(live_table_ids)
+            self._connection.executemany(
+                "DELETE FROM table_metadata WHERE project_id = ? AND dataset_id = ? AND table_id = ?",
+                [(project_id, dataset_id, table_id) for table_id in removed_ids],
+            )
+
+
+class QueryJobConfigFactory:
+    """クエリジョブ設定の生成（google-cloud-bigqueryはジョブ投入時に初めて読み込む）"""
+    
+    def build(self, parameters: List[Tuple[str, str, Any]], **options) -> "bigquery.QueryJobConfig":
+        """(名前, 型, 値)のパラメータとジョブ設定の項目からQueryJobConfigを生成（値がリストの場合は配列パラメータ）"""
+        from google.cloud import bigquery
+        
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ArrayQueryParameter(name, type_name, value) if isinstance(value, list)
+                else bigquery.ScalarQueryParameter(name, type_name, value)
+                for name, type_name, value in parameters
+            ]
+        )
+        for option_name, option_value in options.items():
+            setattr(job_config, option_name, option_value)
+        return job_config
+
+
 class StorageAnalyzer:
     """ストレージ使用量分析クラス"""
     
@@ -91,54 +731,294 @@ class StorageAnalyzer:
     STORAGE_RATE_USD_PER_GB = 0.02  # 月額
     USD_TO_JPY_RATE = 150
     
-    def __init__(self, client: bigquery.Client, project_id: str):
+    # 取得方式
+    ENGINE_TABLE_STORAGE = "table_storage"  # INFORMATION_SCHEMA.TABLE_STORAGEを一括参照
+    ENGINE_PER_TABLE = "per_table"  # テーブル毎にget_tableを呼び出す（フォールバック）
+    
+    # get_tableの同時実行数（全データセット共通の上限）
+    DEFAULT_MAX_WORKERS = 8
+    # 同時に処理するデータセット数
+    DEFAULT_MAX_CONCURRENT_DATASETS = 4
+    # メタデータキャッシュの有効期間（秒）
+    DEFAULT_CACHE_TTL_SECONDS = 21600
+    
+    def __init__(self, client: "bigquery.Client", project_id: str, region: Optional[str] = None,
+                 storage_config: Optional[Dict[str, Any]] = None,
+                 job_config_factory: Optional[QueryJobConfigFactory] = None):
         self.client = client
         self.project_id = project_id
+        self.region = region
+        self.job_config_factory = job_config_factory or QueryJobConfigFactory()
+        storage_config = storage_config or {}
+        self.engine = storage_config.get("engine", self.ENGINE_TABLE_STORAGE)
+        self.max_workers = storage_config.get("max_workers", self.DEFAULT_MAX_WORKERS)
+        self.max_concurrent_datasets = storage_config.get(
+            "max_concurrent_datasets", self.DEFAULT_MAX_CONCURRENT_DATASETS
+        )
+        self.dataset_timeout_seconds = storage_config.get("dataset_timeout_seconds")
+        
+        self.cache = None
+        if storage_config.get("cache_file"):
+            self.cache = TableMetadataCache(
+                storage_config["cache_file"],
+                storage_config.get("cache_ttl_seconds", self.DEFAULT_CACHE_TTL_SECONDS)
+            )
     
-    def analyze_datasets(self, dataset_list: List[str]) -> Dict[str, Any]:
+    def analyze_datasets(self, dataset_list: List[str], deadline: Optional[RunDeadline] = None) -> Dict[str, Any]:
         """データセット群のストレージ使用量を分析"""
+        started_at = time.monotonic()
+        dataset_usages = self.analyze_dataset_usages(dataset_list, deadline)
+        return self.compile_storage_summary(dataset_usages, time.monotonic() - started_at)
+    
+    def analyze_dataset_usages(self, dataset_list: List[str], deadline: Optional[RunDeadline] = None,
+                               on_usage: Optional[Callable[[DatasetUsage], None]] = None) -> List[DatasetUsage]:
+        """
+        データセット毎の使用量を取得（失敗したデータセットは状態とエラー内容を保持）
+        on_usageを指定した場合は、データセット毎の結果が得られた時点で（完了順に）呼び出す
+        """
+        deadline = deadline or RunDeadline()
+        on_usage = on_usage or (lambda usage: None)
         try:
-            dataset_usages = []
-            total_storage_bytes = 0
+            dataset_sizes = None
+            if self.engine == self.ENGINE_TABLE_STORAGE and self.region:
+                dataset_sizes = self._fetch_table_storage_sizes(dataset_list)
             
-            for dataset_name in dataset_list:
-                usage = self._analyze_single_dataset(dataset_name)
-                dataset_usages.append(usage)
-                total_storage_bytes += usage.size_bytes
+            if dataset_sizes is None:
+                return self._analyze_datasets_concurrently(dataset_list, deadline, on_usage)
             
-            return self._compile_storage_summary(dataset_usages, total_storage_bytes)
+            # TABLE_STORAGEに現れないデータセット（名前の誤り、削除済み、別リージョン、テーブルなし）は
+            # テーブル単位の取得で存在を確認し、存在しない場合はエラーとして出力する
+            usages = {}
+            for dataset_name in dataset_list:
+                if dataset_name in dataset_sizes:
+                    usages[dataset_name] = self._calculate_dataset_costs(dataset_name, dataset_sizes[dataset_name])
+                    on_usage(usages[dataset_name])
+            missing_datasets = [dataset_name for dataset_name in dataset_list if dataset_name not in usages]
+            for usage in self._analyze_datasets_concurrently(missing_datasets, deadline, on_usage):
+                usages[usage.dataset_id] = usage
+            return [usages[dataset_name] for dataset_name in dataset_list]
             
         except Exception as error:
             print(f"ストレージ分析でエラーが発生: {error}", file=sys.stderr, flush=True)
             print(traceback.format_exc(), file=sys.stderr, flush=True)
-            sys.exit(103)
+            usages = [
+                self._failed_dataset_usage(dataset_name, "storage", STATUS_ERROR, str(error))
+                for dataset_name in dataset_list
+            ]
+            for usage in usages:
+                on_usage(usage)
+            return usages
+    
+    def _fetch_table_storage_sizes(self, dataset_list: List[str]) -> Optional[Dict[str, int]]:
+        """TABLE_STORAGEビューから全データセットのサイズを一括取得（失敗時はNone）"""
+        try:
+            job_config = self.job_config_factory.build([("datasets", "STRING", dataset_list)])
+            query_job = self.client.query(self._build_table_storage_query(), job_config=job_config)
+            
+            dataset_sizes = {}
+            for row in query_job.result():
+                dataset_sizes[row.dataset_id] = row.total_bytes or 0
+            return dataset_sizes
+            
+        except Exception as error:
+            print(f"TABLE_STORAGE取得エラー（テーブル単位の取得に切り替えます）: {error}", file=sys.stderr, flush=True)
+            return None
+    
+    def analyze_organization_usages(self, organization: Dict[str, Any],
+                                    regions: List[str]) -> Dict[str, List[DatasetUsage]]:
+        """組織モード: TABLE_STORAGE_BY_ORGANIZATIONから全プロジェクトのデータセット別使用量を取得（失敗時は例外を送出）"""
+        parameters = []
+        if organization.get("projects") is not None:
+            parameters.append(("projects", "STRING", organization["projects"]))
+        if organization.get("datasets") is not None:
+            parameters.append(("datasets", "STRING", organization["datasets"]))
+        
+        # データセットはいずれか1つのリージョンに属するため、リージョン毎の結果をそのまま合わせる
+        project_datasets = {}
+        for region in regions:
+            query_job = self.client.query(
+                self._build_organization_storage_query(region, organization),
+                job_config=self.job_config_factory.build(parameters),
+            )
+            for row in query_job.result():
+                project_datasets.setdefault(row.project_id, []).append(
+                    self._calculate_dataset_costs(row.dataset_id, row.total_bytes or 0)
+                )
+        return project_datasets
+    
+    def _build_organization_storage_query(self, region: str, organization: Dict[str, Any]) -> str:
+        """組織モード: プロジェクト・データセット別サイズ集計用のSQLクエリを構築"""
+        filters = ""
+        if organization.get("projects") is not None:
+            filters += "\n            AND project_id IN UNNEST(@projects)"
+        if organization.get("datasets") is not None:
+            filters += "\n            AND table_schema IN UNNEST(@datasets)"
+        return f"""
+        SELECT
+            project_id,
+            table_schema as dataset_id,
+            SUM(total_logical_bytes) as total_bytes
+        FROM
+            `{self.project_id}.region-{region}.INFORMATION_SCHEMA.TABLE_STORAGE_BY_ORGANIZATION`
+        WHERE
+            NOT deleted{filters}
+        GROUP BY project_id, table_schema
+        """
+    
+    def _build_table_storage_query(self) -> str:
+        """データセット別サイズ集計用のSQLクエリを構築"""
+        return f"""
+        SELECT
+            table_schema as dataset_id,
+            SUM(total_logical_bytes) as total_bytes
+        FROM
+            `{self.project_id}.region-{self.region}.INFORMATION_SCHEMA.TABLE_STORAGE`
+        WHERE
+            table_schema IN UNNEST(@datasets)
+            AND NOT deleted
+        GROUP BY table_schema
+        """
     
-    def _analyze_single_dataset(self, dataset_name: str) -> DatasetUsage:
+    def _analyze_datasets_concurrently(self, dataset_list: List[str], run_deadline: RunDeadline,
+                                       on_usage: Callable[[DatasetUsage], None]) -> List[DatasetUsage]:
+        """データセット群を並列に分析（on_usageは完了順、戻り値は入力順を維持）"""
+        if not dataset_list:
+            return []
+        
+        dataset_workers = max(1, min(self.max_concurrent_datasets, len(dataset_list)))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as table_executor, \
+                ThreadPoolExecutor(max_workers=dataset_workers) as dataset_executor:
+            futures = [
+                dataset_executor.submit(self._analyze_single_dataset, dataset_name, table_executor, run_deadline)
+                for dataset_name in dataset_list
+            ]
+            for future in as_completed(futures):
+                on_usage(future.result())
+            return [future.result() for future in futures]
+    
+    def _analyze_single_dataset(self, dataset_name: str, table_executor: ThreadPoolExecutor,
+                                run_deadline: Optional[RunDeadline] = None) -> DatasetUsage:
         """単一データセットの使用量分析"""
+        run_deadline = run_deadline or RunDeadline()
+        started_at = time.monotonic()
+        phase = "pending"
         try:
+            if run_deadline.expired():
+                raise TimeoutError("実行期限を超過したため未処理")
+            deadline = run_deadline.earliest(self.dataset_timeout_seconds)
+            
+            # 各フェーズの開始前に処理期限を確認し、残り時間をAPI呼び出しのタイムアウトとする
+            phase = "get_dataset"
             dataset_ref = self.client.dataset(dataset_name, project=self.project_id)
-            dataset_obj = self.client.get_dataset(dataset_ref)
-            tables = list(self.client.list_tables(dataset_ref))
+            dataset_obj = self.client.get_dataset(dataset_ref, **self._phase_timeout(deadline))
+            phase = "list_tables"
+            tables = list(self.client.list_tables(dataset_ref, **self._phase_timeout(deadline)))
             
-            dataset_total_bytes = 0
-            for table in tables:
-                table_obj = self.client.get_table(table.reference)
-                if hasattr(table_obj, "num_bytes") and table_obj.num_bytes is not None:
-                    dataset_total_bytes += table_obj.num_bytes
+            phase = "get_table"
+            if self.cache is None:
+                dataset_total_bytes, _ = self._sum_table_bytes(tables, table_executor, deadline)
+            else:
+                dataset_total_bytes = self._sum_table_bytes_with_cache(dataset_name, tables, table_executor, deadline)
             
-            return self._calculate_dataset_costs(dataset_name, dataset_total_bytes)
+            usage = self._calculate_dataset_costs(dataset_name, dataset_total_bytes)
+            usage.elapsed_seconds = round(time.monotonic() - started_at, 3)
+            return usage
             
         except Exception as error:
-            print(f"データセット {dataset_name} 分析エラー: {error}", file=sys.stderr, flush=True)
-            return DatasetUsage(
-                dataset_id=dataset_name,
-                size_bytes=0,
-                size_gb=0.0,
-                size_tb=0.0,
-                cost_usd=0.0,
-                cost_jpy=0.0
+            print(f"データセット {dataset_name} 分析エラー（{phase}）: {error}", file=sys.stderr, flush=True)
+            status = STATUS_TIMEOUT if isinstance(error, TIMEOUT_ERRORS) else STATUS_ERROR
+            return self._failed_dataset_usage(
+                dataset_name, phase, status, str(error) or "処理期限を超過", time.monotonic() - started_at
             )
     
+    @staticmethod
+    def _phase_timeout(deadline: Optional[float]) -> Dict[str, float]:
+        """処理期限（monotonic時刻）までの残り時間をAPI呼び出しの引数にする（期限なしの場合は指定しない）"""
+        if deadline is None:
+            return {}
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("処理期限を超過")
+        return {"timeout": remaining}
+    
+    def _failed_dataset_usage(self, dataset_name: str, phase: str, status: str, message: str,
+                              elapsed_seconds: float = 0.0) -> DatasetUsage:
+        """取得に失敗したデータセットの使用量情報"""
+        return DatasetUsage(
+            dataset_id=dataset_name,
+            size_bytes=0,
+            size_gb=0.0,
+            size_tb=0.0,
+            cost_usd=0.0,
+            cost_jpy=0.0,
+            status=status,
+            error_phase=phase,
+            error=message,
+            elapsed_seconds=round(elapsed_seconds, 3)
+        )
+    
+    def _sum_table_bytes_with_cache(self, dataset_name: str, tables: List[Any], executor: ThreadPoolExecutor,
+                                    deadline: Optional[float] = None) -> int:
+        """キャッシュを参照し、変更の可能性があるテーブルのみ再取得して合計"""
+        now = time.time()
+        cached_entries = self.cache.load(self.project_id, dataset_name)
+        
+        cached_bytes = 0
+        stale_tables = []
+        for table in tables:
+            entry = cached_entries.get(table.table_id)
+            if self.cache.is_fresh(entry, self._to_epoch(getattr(table, "created", None)), now):
+                cached_bytes += entry[0]
+            else:
+                stale_tables.append(table)
+        
+        fetched_bytes, fetched_entries = self._sum_table_bytes(stale_tables, executor, deadline)
+        self.cache.store(
+            self.project_id,
+            dataset_name,
+            fetched_entries,
+            [table.table_id for table in tables],
+            now
+        )
+        return cached_bytes + fetched_bytes
+    
+    @staticmethod
+    def _to_epoch(value: Optional[datetime]) -> Optional[float]:
+        """datetimeをエポック秒に変換（Noneはそのまま）"""
+        return value.timestamp() if value is not None else None
+    
+    def _sum_table_bytes(self, tables: List[Any], executor: ThreadPoolExecutor,
+                         deadline: Optional[float] = None) -> Tuple[int, List[Tuple[str, int, Optional[float], Optional[float]]]]:
+        """テーブル群のメタデータを並列取得してバイト数を合計"""
+        total_bytes = 0
+        fetched_entries = []
+        if not tables:
+            return total_bytes, fetched_entries
+        
+        futures = [executor.submit(self.client.get_table, table.reference) for table in tables]
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            for future in as_completed(futures, timeout=timeout):
+                table_obj = future.result()
+                num_bytes = getattr(table_obj, "num_bytes", None) or 0
+                total_bytes += num_bytes
+                fetched_entries.append((
+                    table_obj.table_id,
+                    num_bytes,
+                    self._to_epoch(getattr(table_obj, "created", None)),
+                    self._to_epoch(getattr(table_obj, "modified", None)),
+                ))
+        except BaseException as error:
+            # 期限切れ・エラー時は未着手のテーブル取得を取り消す
+            unfinished = sum(1 for future in futures if not future.done())
+            for future in futures:
+                future.cancel()
+            if isinstance(error, TIMEOUT_ERRORS):
+                raise TimeoutError(f"処理期限を超過（未完了テーブル {unfinished}/{len(futures)} 件）") from error
+            raise
+        
+        return total_bytes, fetched_entries
+    
     def _calculate_dataset_costs(self, dataset_name: str, bytes_count: int) -> DatasetUsage:
         """データセットのコスト計算"""
         gb_size = bytes_count / (1024 ** 3)
@@ -155,121 +1035,1423 @@ class StorageAnalyzer:
             cost_jpy=round(monthly_cost_jpy, 2)
         )
     
-    def _compile_storage_summary(self, usages: List[DatasetUsage], total_bytes: int) -> Dict[str, Any]:
+    def compile_storage_summary(self, usages: List[DatasetUsage], elapsed_seconds: float = 0.0) -> Dict[str, Any]:
         """ストレージ使用量サマリーの作成"""
+        total_bytes = sum(usage.size_bytes for usage in usages if usage.status == STATUS_OK)
         total_gb = total_bytes / (1024 ** 3)
         total_monthly_cost_usd = total_gb * self.STORAGE_RATE_USD_PER_GB
         total_monthly_cost_jpy = total_monthly_cost_usd * self.USD_TO_JPY_RATE
+        errors = [
+            UnitError(f"dataset:{usage.dataset_id}", usage.error_phase, usage.status, usage.error).to_dict()
+            for usage in usages if usage.status != STATUS_OK
+        ]
         
         return {
-            "datasets": [
-                {
-                    "dataset_id": usage.dataset_id,
-                    "size_bytes": usage.size_bytes,
-                    "size_gb": usage.size_gb,
-                    "size_tb": usage.size_tb,
-                    "cost_usd": usage.cost_usd,
-                    "cost_jpy": usage.cost_jpy,
-                }
-                for usage in usages
-            ],
+            "datasets": [self._dataset_usage_to_dict(usage) for usage in usages],
             "total_size_bytes": total_bytes,
             "total_cost_usd": round(total_monthly_cost_usd, 2),
             "total_cost_jpy": round(total_monthly_cost_jpy, 2),
+            "complete": not errors,
+            "errors": errors,
+            "elapsed_seconds": round(elapsed_seconds, 3),
+        }
+    
+    @staticmethod
+    def _dataset_usage_to_dict(usage: DatasetUsage) -> Dict[str, Any]:
+        """データセット使用量を出力用の辞書に変換"""
+        usage_dict = {
+            "dataset_id": usage.dataset_id,
+            "size_bytes": usage.size_bytes,
+            "size_gb": usage.size_gb,
+            "size_tb": usage.size_tb,
+            "cost_usd": usage.cost_usd,
+            "cost_jpy": usage.cost_jpy,
+            "status": usage.status,
+            "elapsed_seconds": usage.elapsed_seconds,
         }
+        if usage.status != STATUS_OK:
+            usage_dict["error_phase"] = usage.error_phase
+            usage_dict["error"] = usage.error
+        return usage_dict
 
 
-class QueryAnalyzer:
-    """クエリ使用量分析クラス"""
+class QueryUsageStore:
+    """クエリ使用量の部分集計とウォーターマークのローカル保存（SQLite）"""
     
-    # 料金設定
-    QUERY_RATE_USD_PER_TB = 6.0
-    USD_TO_JPY_RATE = 150
+    # 部分集計の時間粒度（秒）
+    BUCKET_SECONDS = 60
     
-    def __init__(self, client: bigquery.Client, project_id: str, region: str):
-        self.client = client
-        self.project_id = project_id
-        self.region = region
+    def __init__(self, state_path: str):
+        state_file = Path(state_path)
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(state_file), check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS query_usage_buckets (
+                    project_id TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    bucket_start INTEGER NOT NULL,
+                    user_email TEXT NOT NULL,
+                    bytes_processed INTEGER NOT NULL,
+                    PRIMARY KEY (project_id, region, bucket_start, user_email)
+                ) WITHOUT ROWID
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS query_watermark (
+                    project_id TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    watermark REAL NOT NULL,
+                    covered_from INTEGER,
+                    PRIMARY KEY (project_id, region)
+                )
+                """
+            )
+            # 取り込み範囲の始端を保存する前の状態ファイルは列を追加する（始端が不明なため次回は全範囲を再走査）
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(query_watermark)")]
+            if "covered_from" not in columns:
+                self._connection.execute("ALTER TABLE query_watermark ADD COLUMN covered_from INTEGER")
     
-    def analyze_recent_queries(self) -> Dict[str, Any]:
-        """直近24時間のクエリ使用量を分析（ユーザー別）"""
-        try:
-            time_range = self._get_time_range()
-            query_statement = self._build_usage_query(time_range)
-            
-            job_config = bigquery.QueryJobConfig()
-            query_job = self.client.query(query_statement, job_config=job_config)
-            results = list(query_job.result())
-            
-            return self._process_query_results(results)
-            
-        except Exception as error:
-            print(f"クエリ分析でエラーが発生: {error}", file=sys.stderr, flush=True)
-            print(traceback.format_exc(), file=sys.stderr, flush=True)
-            # エラー時は空の結果を返す
-            return {
-                "users": [],
-                "total_bytes_processed": 0,
-                "total_tb_processed": 0,
-                "total_cost_usd": 0,
-                "total_cost_jpy": 0,
-            }
+    def get_coverage(self, project_id: str, region: str) -> Optional[Tuple[float, Optional[int]]]:
+        """取り込み済み範囲の終端（ウォーターマーク）と始端（エポック秒、不明な場合はNone）を取得"""
+        row = self._connection.execute(
+            "SELECT watermark, covered_from FROM query_watermark WHERE project_id = ? AND region = ?",
+            (project_id, region),
+        ).fetchone()
+        return (row[0], row[1]) if row else None
     
-    def _get_time_range(self) -> tuple:
-        """分析対象の時間範囲を取得"""
-        current_time = datetime.utcnow()
-        start_time = current_time - timedelta(days=1)
-        return start_time, current_time
+    def replace_buckets(self, project_id: str, region: str, scan_start: int,
+                        rows: List[Tuple[int, str, int]], watermark: float, retain_from: int) -> None:
+        """scan_start以降の部分集計を置き換え、保持期間外を削除して取り込み範囲（retain_from〜watermark）を更新"""
+        with self._connection:
+            self._connection.execute(
+                "DELETE FROM query_usage_buckets WHERE project_id = ? AND region = ? "
+                "AND (bucket_start >= ? OR bucket_start < ?)",
+                (project_id, region, scan_start, retain_from),
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO query_usage_buckets "
+                "(project_id, region, bucket_start, user_email, bytes_processed) VALUES (?, ?, ?, ?, ?)",
+                [(project_id, region, bucket_start, email, bytes_processed)
+                 for bucket_start, email, bytes_processed in rows],
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO query_watermark (project_id, region, watermark, covered_from) "
+                "VALUES (?, ?, ?, ?)",
+                (project_id, region, watermark, retain_from),
+            )
     
-    def _build_usage_query(self, time_range: tuple) -> str:
-        """使用量取得用のSQLクエリを構築"""
-        start_time, end_time = time_range
-        
-        return f"""
-        SELECT
-            user_email,
-            SUM(total_bytes_processed) as total_bytes_processed
-        FROM
-            `{self.project_id}.region-{self.region}.INFORMATION_SCHEMA.JOBS_BY_PROJECT`
-        WHERE
-            creation_time >= TIMESTAMP('{start_time.isoformat()}')
-            AND creation_time <= TIMESTAMP('{end_time.isoformat()}')
-            AND job_type = 'QUERY'
-            AND state = 'DONE'
-            AND total_bytes_processed IS NOT NULL
-            AND user_email IS NOT NULL
-        GROUP BY user_email
-        ORDER BY total_bytes_processed DESC
-        """
+    def sum_by_user(self, project_id: str, region: str, start: int) -> Iterator[Tuple[str, int]]:
+        """start以降の部分集計をユーザー別に合計（使用量の多い順、全件を読み込まずに順に返す）"""
+        return self._connection.execute(
+            "SELECT user_email, SUM(bytes_processed) AS total_bytes FROM query_usage_buckets "
+            "WHERE project_id = ? AND region = ? AND bucket_start >= ? "
+            "GROUP BY user_email ORDER BY total_bytes DESC",
+            (project_id, region, start),
+        )
+
+
+class HistoryStore:
+    """使用量履歴のローカル保存（SQLite）"""
     
-    def _process_query_results(self, results) -> Dict[str, Any]:
-        """クエリ結果の処理と集計"""
-        user_usages = []
-        grand_total_bytes = 0
+    # 集約の階層（rawはスナップショットそのもの）と読み出し時の階層選択に使う1区間の長さ（秒、monthlyは概算）
+    TIERS = ["raw", "hourly", "daily", "monthly"]
+    TIER_SECONDS = {"raw": 0, "hourly": 3600, "daily": 86400, "monthly": 30 * 86400}
+    # 階層毎の保持日数（Noneは無期限）
+    DEFAULT_RETENTION_DAYS = {"raw": 14, "hourly": 90, "daily": 730, "monthly": None}
+    # 読み出し時に1系列あたり最低限確保する点数（これを満たす最も粗い階層を選択）
+    DEFAULT_MIN_POINTS = 24
+    
+    # 履歴の種類毎のテーブルと列（scopeは系列を区別する列、keyはデータセット名・メールアドレス）
+    SERIES = {
+        "storage": {
+            "snapshots": "storage_snapshots",
+            "rollups": "storage_rollups",
+            "scope": ["project_id"],
+            "key": "dataset_id",
+            "value": "size_bytes",
+        },
+        "query": {
+            "snapshots": "query_snapshots",
+            "rollups": "query_rollups",
+            "scope": ["project_id", "region", "window"],
+            "key": "user_email",
+            "value": "bytes_processed",
+        },
+    }
+    
+    def __init__(self, history_path: str, retention_days: Optional[Dict[str, Optional[int]]] = None):
+        self._lock = threading.Lock()
+        self.retention_days = dict(self.DEFAULT_RETENTION_DAYS, **(retention_days or {}))
         
-        for row in results:
-            processed_bytes = row.total_bytes_processed or 0
-            grand_total_bytes += processed_bytes
-            
-            user_usage = self._calculate_user_costs(row.user_email, processed_bytes)
-            user_usages.append(user_usage)
+        history_file = Path(history_path)
+        history_file.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(history_file), check_same_thread=False)
+        # 常駐モードの書き込み中も別プロセスから読み出せるようにする
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            # 実行毎のスナップショット。主キーでデータセット・ユーザー毎の期間読み出し、
+            # 時刻の索引（値を含むカバリングインデックス）で全データセット・全ユーザーの期間読み出しを行う
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS storage_snapshots (
+                    project_id TEXT NOT NULL,
+                    dataset_id TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    PRIMARY KEY (project_id, dataset_id, ts)
+                ) WITHOUT ROWID
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS storage_snapshots_ts "
+                "ON storage_snapshots (project_id, ts, dataset_id, size_bytes)"
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS query_snapshots (
+                    project_id TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    window TEXT NOT NULL,
+                    user_email TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    bytes_processed INTEGER NOT NULL,
+                    PRIMARY KEY (project_id, region, window, user_email, ts)
+                ) WITHOUT ROWID
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS query_snapshots_ts "
+                "ON query_snapshots (project_id, region, window, ts, user_email, bytes_processed)"
+            )
+            # 集約済みの値（サンプル数・合計・最大）。bucket_startは階層毎の区間の開始時刻
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS storage_rollups (
+                    tier TEXT NOT NULL,
+                    project_id TEXT NOT NULL,
+                    dataset_id TEXT NOT NULL,
+                    bucket_start INTEGER NOT NULL,
+                    sample_count INTEGER NOT NULL,
+                    sum_bytes INTEGER NOT NULL,
+                    max_bytes INTEGER NOT NULL,
+                    PRIMARY KEY (tier, project_id, dataset_id, bucket_start)
+                ) WITHOUT ROWID
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS storage_rollups_ts "
+                "ON storage_rollups (tier, project_id, bucket_start, dataset_id, sample_count, sum_bytes, max_bytes)"
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS query_rollups (
+                    tier TEXT NOT NULL,
+                    project_id TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    window TEXT NOT NULL,
+                    user_email TEXT NOT NULL,
+                    bucket_start INTEGER NOT NULL,
+                    sample_count INTEGER NOT NULL,
+                    sum_bytes INTEGER NOT NULL,
+                    max_bytes INTEGER NOT NULL,
+                    PRIMARY KEY (tier, project_id, region, window, user_email, bucket_start)
+                ) WITHOUT ROWID
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS query_rollups_ts "
+                "ON query_rollups (tier, project_id, region, window, bucket_start, user_email, "
+                "sample_count, sum_bytes, max_bytes)"
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS daily_query_usage (
+                    project_id TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    day_start INTEGER NOT NULL,
+                    user_email TEXT NOT NULL,
+                    bytes_processed INTEGER NOT NULL,
+                    job_count INTEGER NOT NULL,
+                    PRIMARY KEY (project_id, region, day_start, user_email)
+                ) WITHOUT ROWID
+                """
+            )
+            # 利用が0件の日も取得済みとして記録する
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS daily_query_days (
+                    project_id TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    day_start INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    PRIMARY KEY (project_id, region, day_start)
+                ) WITHOUT ROWID
+                """
+            )
+    
+    @classmethod
+    def from_config(cls, history_config: Dict[str, Any]) -> "HistoryStore":
+        """settings.jsonのhistory設定から生成"""
+        return cls(history_config.get("file", "logs/history.sqlite3"), history_config.get("retention_days"))
+    
+    def append_storage(self, project_id: str, ts: int, datasets: List[Tuple[str, int]]) -> None:
+        """データセット別のストレージ使用量（データセット名, バイト数）を時刻tsのスナップショットとして追加"""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO storage_snapshots (project_id, dataset_id, ts, size_bytes) VALUES (?, ?, ?, ?)",
+                [(project_id, dataset_id, ts, size_bytes) for dataset_id, size_bytes in datasets],
+            )
+    
+    def append_query(self, project_id: str, region: str, window: str, ts: int, users: List[Tuple[str, int]]) -> None:
+        """集計期間windowのユーザー別処理バイト数（メールアドレス, バイト数）を時刻tsのスナップショットとして追加"""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO query_snapshots "
+                "(project_id, region, window, user_email, ts, bytes_processed) VALUES (?, ?, ?, ?, ?, ?)",
+                [(project_id, region, window, email, ts, bytes_processed) for email, bytes_processed in users],
+            )
+    
+    def read_storage(self, project_id: str, start: int, end: int,
+                     dataset_id: Optional[str] = None) -> List[Tuple[int, str, int]]:
+        """[start, end)のストレージ使用量スナップショット（時刻, データセット名, バイト数）を時刻順に取得"""
+        if dataset_id is not None:
+            statement = ("SELECT ts, dataset_id, size_bytes FROM storage_snapshots "
+                         "WHERE project_id = ? AND dataset_id = ? AND ts >= ? AND ts < ? ORDER BY ts")
+            parameters = (project_id, dataset_id, start, end)
+        else:
+            statement = ("SELECT ts, dataset_id, size_bytes FROM storage_snapshots INDEXED BY storage_snapshots_ts "
+                         "WHERE project_id = ? AND ts >= ? AND ts < ? ORDER BY ts, dataset_id")
+            parameters = (project_id, start, end)
+        with self._lock:
+            return self._connection.execute(statement, parameters).fetchall()
+    
+    def read_query(self, project_id: str, region: str, window: str, start: int, end: int,
+                   user_email: Optional[str] = None) -> List[Tuple[int, str, int]]:
+        """[start, end)のクエリ使用量スナップショット（時刻, メールアドレス, バイト数）を時刻順に取得"""
+        if user_email is not None:
+            statement = ("SELECT ts, user_email, bytes_processed FROM query_snapshots "
+                         "WHERE project_id = ? AND region = ? AND window = ? AND user_email = ? "
+                         "AND ts >= ? AND ts < ? ORDER BY ts")
+            parameters = (project_id, region, window, user_email, start, end)
+        else:
+            statement = ("SELECT ts, user_email, bytes_processed FROM query_snapshots INDEXED BY query_snapshots_ts "
+                         "WHERE project_id = ? AND region = ? AND window = ? AND ts >= ? AND ts < ? "
+                         "ORDER BY ts, user_email")
+            parameters = (project_id, region, window, start, end)
+        with self._lock:
+            return self._connection.execute(statement, parameters).fetchall()
+    
+    def read_storage_series(self, project_id: str, start: int, end: int, dataset_id: Optional[str] = None,
+                            min_points: int = DEFAULT_MIN_POINTS,
+                            now: Optional[int] = None) -> List[Tuple[int, str, float, int, int, str]]:
+        """[start, end)のストレージ使用量を範囲に応じた階層から読み出す
+        （時刻, データセット名, 平均バイト数, 最大バイト数, サンプル数, 階層）"""
+        return self._read_series("storage", [project_id], start, end, dataset_id, min_points, now)
+    
+    def read_query_series(self, project_id: str, region: str, window: str, start: int, end: int,
+                          user_email: Optional[str] = None, min_points: int = DEFAULT_MIN_POINTS,
+                          now: Optional[int] = None) -> List[Tuple[int, str, float, int, int, str]]:
+        """[start, end)のクエリ使用量を範囲に応じた階層から読み出す
+        （時刻, メールアドレス, 平均バイト数, 最大バイト数, サンプル数, 階層）"""
+        return self._read_series("query", [project_id, region, window], start, end, user_email, min_points, now)
+    
+    def select_tier(self, start: int, end: int, min_points: int = DEFAULT_MIN_POINTS, now: Optional[int] = None) -> str:
+        """範囲をmin_points点以上で表せる最も粗い階層を選択（保持期間が開始時刻に届かない階層は除く）"""
+        now = int(now or time.time())
+        chosen = 0
+        while chosen < len(self.TIERS) - 1 and not self._retains(self.TIERS[chosen], start, now):
+            chosen += 1
+        while (chosen < len(self.TIERS) - 1
+               and self.TIER_SECONDS[self.TIERS[chosen + 1]] * min_points <= end - start):
+            chosen += 1
+        return self.TIERS[chosen]
+    
+    def _retains(self, tier: str, start: int, now: int) -> bool:
+        """階層の保持期間が開始時刻を含むか"""
+        retention_days = self.retention_days.get(tier)
+        return retention_days is None or start >= now - retention_days * 86400
+    
+    def _read_series(self, kind: str, scope_values: List[str], start: int, end: int, key: Optional[str],
+                     min_points: int, now: Optional[int]) -> List[Tuple[int, str, float, int, int, str]]:
+        """選択した階層から読み出し、集約が済んでいない直近の範囲は細かい階層で補う"""
+        series = self.SERIES[kind]
+        tier = self.select_tier(start, end, min_points, now)
+        scope_filter = " AND ".join(f"{column} = ?" for column in series["scope"])
+        key_filter = f" AND {series['key']} = ?" if key is not None else ""
+        key_values = [key] if key is not None else []
         
-        return self._compile_query_summary(user_usages, grand_total_bytes)
+        rows = []
+        segment_start = start
+        with self._lock:
+            for segment_tier in reversed(self.TIERS[:self.TIERS.index(tier) + 1]):
+                if segment_start >= end:
+                    break
+                if segment_tier == "raw":
+                    rows.extend(
+                        (ts, row_key, value, value, 1, "raw")
+                        for ts, row_key, value in self._connection.execute(
+                            f"SELECT ts, {series['key']}, {series['value']} FROM {series['snapshots']} "
+                            f"WHERE {scope_filter}{key_filter} AND ts >= ? AND ts < ? ORDER BY ts, {series['key']}",
+                            (*scope_values, *key_values, segment_start, end),
+                        )
+                    )
+                    break
+                
+                compacted_until = self._compacted_until(series, segment_tier, scope_values)
+                segment_end = min(end, compacted_until) if compacted_until is not None else segment_start
+                if segment_end <= segment_start:
+                    continue
+                rows.extend(
+                    (bucket_start, row_key, sum_bytes / sample_count, max_bytes, sample_count, segment_tier)
+                    for bucket_start, row_key, sample_count, sum_bytes, max_bytes in self._connection.execute(
+                        f"SELECT bucket_start, {series['key']}, sample_count, sum_bytes, max_bytes "
+                        f"FROM {series['rollups']} WHERE tier = ? AND {scope_filter}{key_filter} "
+                        f"AND bucket_start >= ? AND bucket_start < ? ORDER BY bucket_start, {series['key']}",
+                        (segment_tier, *scope_values, *key_values,
+                         self._bucket_floor(segment_tier, segment_start), segment_end),
+                    )
+                )
+                segment_start = segment_end
+        return rows
     
-    def _calculate_user_costs(self, email: str, bytes_processed: int) -> UserQueryUsage:
-        """ユーザー別のクエリコスト計算"""
-        tb_processed = bytes_processed / (1024 ** 4)
-        cost_usd = tb_processed * self.QUERY_RATE_USD_PER_TB
-        cost_jpy = cost_usd * self.USD_TO_JPY_RATE
+    def _compacted_until(self, series: Dict[str, Any], tier: str, scope_values: List[str]) -> Optional[int]:
+        """階層に集約済みの範囲の終端（未集約はNone）"""
+        scope_filter = " AND ".join(f"{column} = ?" for column in series["scope"])
+        row = self._connection.execute(
+            f"SELECT MAX(bucket_start) FROM {series['rollups']} WHERE tier = ? AND {scope_filter}",
+            (tier, *scope_values),
+        ).fetchone()
+        return self._bucket_end(tier, row[0]) if row[0] is not None else None
+    
+    def compact(self, project_id: str, now: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """完了した区間のスナップショットを時間・日・月単位に集約し、保持期間を過ぎた値を削除"""
+        now = int(now or time.time())
+        stats = {}
+        with self._lock, self._connection:
+            for kind, series in self.SERIES.items():
+                compacted_until = {}
+                rolled = {}
+                source_tier = "raw"
+                for tier in self.TIERS[1:]:
+                    compacted_until[tier], rolled[tier] = self._compact_tier(series, project_id, source_tier, tier, now)
+                    source_tier = tier
+                deleted = self._apply_retention(series, project_id, compacted_until, now)
+                stats[kind] = {"rolled_up": rolled, "deleted": deleted}
+        return stats
+    
+    def _compact_tier(self, series: Dict[str, Any], project_id: str, source_tier: str, tier: str,
+                      now: int) -> Tuple[int, int]:
+        """1つ細かい階層から、前回集約以降に完了した区間を集約（集約済みの終端と書き込み件数を返す）"""
+        row = self._connection.execute(
+            f"SELECT MAX(bucket_start) FROM {series['rollups']} WHERE tier = ? AND project_id = ?",
+            (tier, project_id),
+        ).fetchone()
+        compact_from = self._bucket_end(tier, row[0]) if row[0] is not None else 0
+        compact_until = self._bucket_floor(tier, now)
+        if compact_until <= compact_from:
+            return compact_until, 0
         
-        return UserQueryUsage(
-            user_email=email,
+        columns = ", ".join(series["scope"] + [series["key"]])
+        if source_tier == "raw":
+            source = (f"SELECT {columns}, ts, 1 AS sample_count, {series['value']} AS sum_bytes, "
+                      f"{series['value']} AS max_bytes FROM {series['snapshots']} "
+                      f"WHERE project_id = ? AND ts >= ? AND ts < ?")
+            parameters = (project_id, compact_from, compact_until)
+        else:
+            source = (f"SELECT {columns}, bucket_start AS ts, sample_count, sum_bytes, max_bytes "
+                      f"FROM {series['rollups']} WHERE tier = ? AND project_id = ? AND bucket_start >= ? AND bucket_start < ?")
+            parameters = (source_tier, project_id, compact_from, compact_until)
+        
+        cursor = self._connection.execute(
+            f"INSERT OR REPLACE INTO {series['rollups']} "
+            f"(tier, {columns}, bucket_start, sample_count, sum_bytes, max_bytes) "
+            f"SELECT ?, {columns}, {self._bucket_sql(tier, 'ts')} AS bucket, "
+            f"SUM(sample_count), SUM(sum_bytes), MAX(max_bytes) FROM ({source}) GROUP BY {columns}, bucket",
+            (tier, *parameters),
+        )
+        return compact_until, cursor.rowcount
+    
+    def _apply_retention(self, series: Dict[str, Any], project_id: str, compacted_until: Dict[str, int],
+                         now: int) -> Dict[str, int]:
+        """保持期間を過ぎた値を削除（次の階層に集約済みの範囲に限る）"""
+        deleted = {}
+        for index, tier in enumerate(self.TIERS):
+            retention_days = self.retention_days.get(tier)
+            if retention_days is None:
+                continue
+            cutoff = now - retention_days * 86400
+            if index + 1 < len(self.TIERS):
+                cutoff = min(cutoff, compacted_until[self.TIERS[index + 1]])
+            if tier == "raw":
+                cursor = self._connection.execute(
+                    f"DELETE FROM {series['snapshots']} WHERE project_id = ? AND ts < ?", (project_id, cutoff)
+                )
+            else:
+                cursor = self._connection.execute(
+                    f"DELETE FROM {series['rollups']} WHERE tier = ? AND project_id = ? AND bucket_start < ?",
+                    (tier, project_id, cutoff),
+                )
+            deleted[tier] = cursor.rowcount
+        return deleted
+    
+    @classmethod
+    def _bucket_sql(cls, tier: str, column: str) -> str:
+        """時刻の列を階層の区間の開始時刻に切り捨てるSQL式"""
+        if tier == "monthly":
+            return f"CAST(strftime('%s', {column}, 'unixepoch', 'start of month') AS INTEGER)"
+        return f"({column} - {column} % {cls.TIER_SECONDS[tier]})"
+    
+    @classmethod
+    def _bucket_floor(cls, tier: str, ts: int) -> int:
+        """時刻を階層の区間の開始時刻に切り捨て"""
+        if tier == "raw":
+            return ts
+        if tier == "monthly":
+            moment = datetime.utcfromtimestamp(ts)
+            return calendar.timegm((moment.year, moment.month, 1, 0, 0, 0))
+        return ts - ts % cls.TIER_SECONDS[tier]
+    
+    @classmethod
+    def _bucket_end(cls, tier: str, bucket_start: int) -> int:
+        """階層の区間の終了時刻"""
+        if tier == "monthly":
+            moment = datetime.utcfromtimestamp(bucket_start)
+            return calendar.timegm((moment.year + moment.month // 12, moment.month % 12 + 1, 1, 0, 0, 0))
+        return bucket_start + cls.TIER_SECONDS[tier]
+    
+    def stored_days(self, project_id: str, region: str, start: int, end: int) -> set:
+        """[start, end)の範囲で保存済みの日（開始時刻のエポック秒）を取得"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT day_start FROM daily_query_days "
+                "WHERE project_id = ? AND region = ? AND day_start >= ? AND day_start < ?",
+                (project_id, region, start, end),
+            ).fetchall()
+        return {row[0] for row in rows}
+    
+    def read_daily_usage(self, project_id: str, region: str, start: int, end: int,
+                         user_email: Optional[str] = None) -> List[Tuple[int, str, int, int]]:
+        """[start, end)に開始する日の再構築済み使用量（日の開始時刻, メールアドレス, 処理バイト数, ジョブ数）を日付順に取得"""
+        statement = ("SELECT day_start, user_email, bytes_processed, job_count FROM daily_query_usage "
+                     "WHERE project_id = ? AND region = ? AND day_start >= ? AND day_start < ?")
+        parameters = [project_id, region, start, end]
+        if user_email is not None:
+            statement += " AND user_email = ?"
+            parameters.append(user_email)
+        with self._lock:
+            return self._connection.execute(statement + " ORDER BY day_start, user_email", parameters).fetchall()
+    
+    def store_daily_usage(self, project_id: str, region: str, day_start: int,
+                          rows: List[Tuple[str, int, int]]) -> None:
+        """1日分のユーザー別使用量（メールアドレス, 処理バイト数, ジョブ数）を置き換えて保存"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM daily_query_usage WHERE project_id = ? AND region = ? AND day_start = ?",
+                (project_id, region, day_start),
+            )
+            self._connection.executemany(
+                "INSERT INTO daily_query_usage "
+                "(project_id, region, day_start, user_email, bytes_processed, job_count) VALUES (?, ?, ?, ?, ?, ?)",
+                [(project_id, region, day_start, email, bytes_processed, job_count)
+                 for email, bytes_processed, job_count in rows],
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO daily_query_days (project_id, region, day_start, stored_at) VALUES (?, ?, ?, ?)",
+                (project_id, region, day_start, time.time()),
+            )
+
+
+class QueryChunkCheckpoint:
+    """分割走査の完了済み区間の結果を保存するチェックポイント（SQLite）"""
+    
+    # 再開されないまま残ったチェックポイントを破棄するまでの秒数
+    STALE_SECONDS = 86400
+    
+    def __init__(self, checkpoint_path: str):
+        self._lock = threading.Lock()
+        
+        checkpoint_file = Path(checkpoint_path)
+        checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(checkpoint_file), check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS query_chunk_checkpoint (
+                    chunk_key TEXT NOT NULL PRIMARY KEY,
+                    rows_json TEXT NOT NULL,
+                    stored_at REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            self._connection.execute(
+                "DELETE FROM query_chunk_checkpoint WHERE stored_at < ?", (time.time() - self.STALE_SECONDS,)
+            )
+    
+    def load(self, chunk_key: str) -> Optional[List[Any]]:
+        """保存済みの区間結果を取得（未保存はNone）"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT rows_json FROM query_chunk_checkpoint WHERE chunk_key = ?", (chunk_key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return [SimpleNamespace(**values) for values in json.loads(row[0])]
+    
+    def store(self, chunk_key: str, rows: List[Any]) -> None:
+        """区間の結果を保存"""
+        rows_json = json.dumps([
+            dict(row.items()) if hasattr(row, "items") else dict(vars(row)) for row in rows
+        ])
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO query_chunk_checkpoint (chunk_key, rows_json, stored_at) VALUES (?, ?, ?)",
+                (chunk_key, rows_json, time.time()),
+            )
+    
+    def discard(self, chunk_keys: List[str]) -> None:
+        """走査全体の完了後に区間の結果を削除"""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM query_chunk_checkpoint WHERE chunk_key = ?", [(chunk_key,) for chunk_key in chunk_keys]
+            )
+
+
+class ChunkedScanPlan:
+    """
+    分割走査の計画（区間毎のクエリ文・チェックポイントの復元結果・投入済みジョブを保持）
+    投入時に同時実行数の上限分のジョブを先に投入し、残りは結果の回収時に投入する
+    """
+    
+    def __init__(self, chunks: List[Tuple[datetime, datetime]]):
+        self.chunks = chunks
+        self.job_id = None
+        # 区間毎の(クエリ文, パラメータ)とチェックポイントのキー
+        self.queries = []
+        self.chunk_keys = []
+        # チェックポイントから復元した区間の結果と、投入済みの区間のジョブ（区間の番号 → 値）
+        self.restored_rows = {}
+        self.submitted_jobs = {}
+
+
+class CachedQueryJob:
+    """同一クエリの前回結果を返すジョブ（BigQueryへの再投入を行わない）"""
+    
+    def __init__(self, rows: List[Any]):
+        self._rows = rows
+        self.job_id = None
+        self.cache_hit = True
+        self.total_bytes_billed = 0
+    
+    def result(self, *args, **kwargs) -> List[Any]:
+        return self._rows
+
+
+class QueryAnalyzer:
+    """クエリ使用量分析クラス"""
+    
+    # 料金設定
+    QUERY_RATE_USD_PER_TB = 6.0
+    USD_TO_JPY_RATE = 150
+    
+    # 差分取得時に前回終端から遡って再集計する時間（実行中だったジョブの完了を拾うため）
+    DEFAULT_SETTLE_SECONDS = 3600
+    
+    # 集計期間（"15m", "1h", "24h", "7d"などの形式）
+    DEFAULT_WINDOWS = ["24h"]
+    PRIMARY_WINDOW = "24h"
+    WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+    
+    # 課金バイト数の上限超過時に走査範囲を分割する最小の長さ（秒）
+    DEFAULT_MIN_SPLIT_SECONDS = 3600
+    
+    # JOBSビューの保持期間（日）。履歴の再構築はこの範囲まで遡る
+    JOBS_RETENTION_DAYS = 180
+    
+    # 長い走査範囲を分割する区間の長さ（秒）と同時に実行するクエリジョブ数
+    DEFAULT_CHUNK_SECONDS = 86400
+    DEFAULT_MAX_CONCURRENT_CHUNKS = 4
+    
+    def __init__(self, client: "bigquery.Client", project_id: str, region: str,
+                 query_config: Optional[Dict[str, Any]] = None, organization: Optional[Dict[str, Any]] = None,
+                 job_config_factory: Optional[QueryJobConfigFactory] = None):
+        self.client = client
+        self.project_id = project_id
+        self.region = region
+        self.job_config_factory = job_config_factory or QueryJobConfigFactory()
+        query_config = query_config or {}
+        
+        # 組織モードではJOBS_BY_ORGANIZATIONをプロジェクト・ユーザー別に集計する（projectsの絞り込みはSQLで行う）
+        self.organization = organization
+        self.organization_projects = (organization or {}).get("projects")
+        
+        self.usage_store = None
+        if query_config.get("incremental") and organization is None:
+            self.usage_store = QueryUsageStore(query_config.get("state_file", "logs/query_state.sqlite3"))
+        self.settle_seconds = query_config.get("settle_seconds", self.DEFAULT_SETTLE_SECONDS)
+        
+        window_labels = query_config.get("windows", self.DEFAULT_WINDOWS)
+        self.windows = [(label, self.parse_window(label)) for label in window_labels]
+        self.primary_window = self.select_primary_window(window_labels)
+        self.report_windows = "windows" in query_config
+        
+        # 集計期間の境界を揃える単位（秒）。同一区間内の実行では同じクエリ文になる
+        self.align_seconds = query_config.get("align_seconds")
+        self._last_query_key = None
+        self._last_query_rows = None
+        self._pending_query_key = None
+        
+        # 監視クエリ自体の課金上限。超過した場合は走査範囲を分割して再実行する
+        self.maximum_bytes_billed = query_config.get("maximum_bytes_billed")
+        self.min_split_seconds = query_config.get("min_split_seconds", self.DEFAULT_MIN_SPLIT_SECONDS)
+        
+        # 走査範囲がchunk_secondsより長い場合は区間に分割して並列に走査する（0で分割しない）
+        self.chunk_seconds = query_config.get("chunk_seconds", self.DEFAULT_CHUNK_SECONDS)
+        self.max_concurrent_chunks = query_config.get("max_concurrent_chunks", self.DEFAULT_MAX_CONCURRENT_CHUNKS) or 1
+        self.checkpoint = None
+        if query_config.get("checkpoint_file"):
+            self.checkpoint = QueryChunkCheckpoint(query_config["checkpoint_file"])
+        
+        self._pending_windows = None
+        self._pending_retain_from = None
+        self._pending_scan = None
+        self._submit_error = None
+        self._submitted_at = None
+    
+    @classmethod
+    def parse_window(cls, label: str) -> timedelta:
+        """集計期間の表記（例: "1h", "7d"）をtimedeltaに変換"""
+        matched = re.fullmatch(r"(\d+)([mhd])", str(label))
+        if matched is None or int(matched.group(1)) <= 0:
+            raise ValueError(f"集計期間の形式が不正: {label}（例: 15m, 1h, 24h, 7d）")
+        return timedelta(**{cls.WINDOW_UNITS[matched.group(2)]: int(matched.group(1))})
+    
+    @classmethod
+    def select_primary_window(cls, window_labels: List[str]) -> str:
+        """レポートの最上位に配置する主集計期間（24hがあれば24h、なければ先頭）"""
+        return cls.PRIMARY_WINDOW if cls.PRIMARY_WINDOW in window_labels else window_labels[0]
+    
+    def analyze_recent_queries(self, deadline: Optional[RunDeadline] = None,
+                               on_user: Optional[Callable[[Dict[str, Any], Optional[str]], None]] = None) -> Dict[str, Any]:
+        """直近のクエリ使用量を集計期間毎に分析（ユーザー別）"""
+        query_job = self.submit_recent_queries()
+        return self.collect_recent_queries(query_job, deadline, on_user)
+    
+    def submit_recent_queries(self) -> Optional[Any]:
+        """使用量取得クエリを投入（完了は待たない、失敗時はNone）"""
+        self._submitted_at = time.monotonic()
+        self._submit_error = None
+        try:
+            window_starts, end_time = self._get_window_starts()
+            self._pending_windows = (window_starts, end_time)
+            if self.usage_store is not None:
+                scan_start = self._incremental_scan_start(min(window_starts.values()))
+            else:
+                scan_start = min(window_starts.values())
+            self._pending_scan = (scan_start, end_time)
+            
+            query_statement, parameters = self._build_scan_query(scan_start, end_time)
+            self._pending_query_key = (query_statement, tuple(parameters))
+            if self.align_seconds and self._pending_query_key == self._last_query_key:
+                return CachedQueryJob(self._last_query_rows)
+            
+            chunks = self._plan_chunks(scan_start, end_time)
+            if len(chunks) > 1:
+                return self._submit_chunks(ChunkedScanPlan(chunks))
+            return self._run_query(query_statement, parameters)
+            
+        except Exception as error:
+            print(f"クエリ投入でエラーが発生: {error}", file=sys.stderr, flush=True)
+            print(traceback.format_exc(), file=sys.stderr, flush=True)
+            self._submit_error = UnitError("query", "submit", STATUS_ERROR, str(error))
+            return None
+    
+    def collect_recent_queries(self, query_job: Optional[Any], deadline: Optional[RunDeadline] = None,
+                               on_user: Optional[Callable[[Dict[str, Any], Optional[str]], None]] = None) -> Dict[str, Any]:
+        """
+        投入済みクエリの完了を待って結果を集計
+        on_userを指定した場合、分割しない走査と差分取得ではユーザー毎の使用量（主集計期間はwindow=None、
+        query.windows指定時は期間毎にも期間名）を算出され次第渡し、返す集計結果にはユーザーの一覧を含めない。
+        区間毎の結果をユーザー別に合算する分割走査では、従来どおり集計結果にユーザーの一覧を含める
+        """
+        deadline = deadline or RunDeadline()
+        try:
+            if query_job is None:
+                return self._empty_query_summary(
+                    self._submit_error or UnitError("query", "submit", STATUS_ERROR, "クエリが投入されていません")
+                )
+            
+            if on_user is not None and self.usage_store is not None:
+                # 差分の部分集計はローカルに反映した後、ユーザー別の合計をSQLiteから順に読み出す
+                self._store_incremental_rows(self._collect_rows(query_job, deadline))
+                summary = self._stream_incremental_users(on_user)
+            elif on_user is not None and not isinstance(query_job, ChunkedScanPlan):
+                summary = self._stream_window_rows(query_job, deadline, on_user)
+            elif self.usage_store is not None:
+                summary = self._apply_incremental_rows(self._collect_rows(query_job, deadline))
+            else:
+                summary = self._process_window_results(self._collect_rows(query_job, deadline))
+            summary["elapsed_seconds"] = self._elapsed_since_submit()
+            return summary
+            
+        except Exception as error:
+            print(f"クエリ分析でエラーが発生: {error}", file=sys.stderr, flush=True)
+            print(traceback.format_exc(), file=sys.stderr, flush=True)
+            status = STATUS_TIMEOUT if isinstance(error, TIMEOUT_ERRORS) else STATUS_ERROR
+            return self._empty_query_summary(UnitError("query", "result", status, str(error) or "処理期限を超過"))
+    
+    def collect_organization_queries(self, query_job: Optional[Any],
+                                     deadline: Optional[RunDeadline] = None) -> Dict[str, Dict[str, Any]]:
+        """組織モード: 投入済みクエリの完了を待ってプロジェクト別に集計（失敗時は例外を送出）"""
+        deadline = deadline or RunDeadline()
+        if query_job is None:
+            raise RuntimeError(self._submit_error.error if self._submit_error else "クエリが投入されていません")
+        
+        project_rows = {}
+        for row in self._collect_rows(query_job, deadline):
+            project_rows.setdefault(row.project_id, []).append(row)
+        
+        project_summaries = {}
+        for project_id, rows in project_rows.items():
+            project_summaries[project_id] = self._process_window_results(rows)
+            project_summaries[project_id]["elapsed_seconds"] = self._elapsed_since_submit()
+        return project_summaries
+    
+    def empty_summary(self) -> Dict[str, Any]:
+        """利用がない場合の集計結果"""
+        summary = self._process_window_results([])
+        summary["elapsed_seconds"] = self._elapsed_since_submit()
+        return summary
+    
+    def _collect_rows(self, query_job: Any, deadline: RunDeadline) -> List[Any]:
+        """投入済みのジョブ（または分割走査の計画）の結果行を取得"""
+        scan_start, end_time = self._pending_scan
+        if isinstance(query_job, ChunkedScanPlan):
+            results = self._collect_chunks(query_job, deadline)
+        else:
+            results = self._fetch_scan_rows(query_job, scan_start, end_time, deadline)
+        self._remember_result(query_job, results)
+        return results
+    
+    @staticmethod
+    def _wait_for_result(query_job: Any, deadline: RunDeadline) -> Any:
+        """実行期限を考慮してクエリジョブの完了を待つ"""
+        remaining = deadline.remaining()
+        if remaining is None:
+            return query_job.result()
+        if remaining <= 0:
+            raise TimeoutError("実行期限を超過したためクエリ結果を待機しません")
+        return query_job.result(timeout=remaining)
+    
+    def _elapsed_since_submit(self) -> float:
+        """クエリ投入からの経過秒数"""
+        if self._submitted_at is None:
+            return 0.0
+        return round(time.monotonic() - self._submitted_at, 3)
+    
+    def _empty_query_summary(self, error: UnitError) -> Dict[str, Any]:
+        """エラー時に返す空の結果"""
+        return {
+            "users": [],
+            "total_bytes_processed": 0,
+            "total_tb_processed": 0,
+            "total_cost_usd": 0,
+            "total_cost_jpy": 0,
+            "complete": False,
+            "errors": [error.to_dict()],
+            "elapsed_seconds": self._elapsed_since_submit(),
+        }
+    
+    def _incremental_scan_start(self, oldest_start: datetime) -> datetime:
+        """差分取得で走査を開始する時刻（前回のウォーターマークから再集計分を遡った時刻）"""
+        retain_from = self._floor_to_bucket(oldest_start)
+        self._pending_retain_from = retain_from
+        
+        coverage = self.usage_store.get_coverage(self.project_id, self.region)
+        if coverage is None:
+            return datetime.utcfromtimestamp(retain_from)
+        watermark, covered_from = coverage
+        if covered_from is None or covered_from > retain_from:
+            # 集計期間を広げた場合など、取り込み済みの範囲が最も長い期間の始端に届かない場合は全範囲を再走査する
+            print(f"差分取得の状態が集計期間の始端（{datetime.utcfromtimestamp(retain_from).isoformat()}）を"
+                  f"含まないため全範囲を再走査します", file=sys.stderr, flush=True)
+            return datetime.utcfromtimestamp(retain_from)
+        return datetime.utcfromtimestamp(max(retain_from, self._floor_to_bucket(
+            datetime.utcfromtimestamp(watermark - self.settle_seconds)
+        )))
+    
+    def _build_scan_query(self, range_start: datetime, range_end: datetime) -> Tuple[str, List[Tuple[str, str, Any]]]:
+        """[range_start, range_end)を走査するSQLとクエリパラメータ（名前, 型, 値）を構築"""
+        parameters = [
+            ("range_start", "TIMESTAMP", range_start.replace(tzinfo=timezone.utc)),
+            ("range_end", "TIMESTAMP", range_end.replace(tzinfo=timezone.utc)),
+        ]
+        if self.usage_store is not None:
+            return self._build_incremental_query(), parameters
+        
+        if self.organization_projects is not None:
+            parameters.append(("projects", "STRING", list(self.organization_projects)))
+        window_starts, _ = self._pending_windows
+        for index, start_time in enumerate(window_starts.values()):
+            # 範囲内に切り詰めても集計結果は変わらず、過去の区間では実行時刻に依らない同一のパラメータになる
+            clamped_start = max(range_start, min(start_time, range_end))
+            parameters.append((f"start_w{index}", "TIMESTAMP", clamped_start.replace(tzinfo=timezone.utc)))
+        return self._build_usage_query(len(window_starts)), parameters
+    
+    def backfill_daily_usage(self, history_store: HistoryStore, days: int = JOBS_RETENTION_DAYS,
+                             deadline: Optional[RunDeadline] = None) -> Dict[str, Any]:
+        """JOBSビューの保持期間内の日別・ユーザー別使用量を再構築して履歴に保存（保存済みの日は取得しない）"""
+        deadline = deadline or RunDeadline()
+        started_at = time.monotonic()
+        
+        # 再集計の待ち時間を過ぎて確定した日のみを対象にする
+        now_epoch = int(self._to_epoch_seconds(datetime.utcnow()))
+        settled_epoch = now_epoch - self.settle_seconds
+        end_day = settled_epoch - settled_epoch % 86400
+        # 保持期間の境界を含む日は一部のジョブが削除済みのため、保持期間内に収まる最初の日から取得する
+        retain_from = now_epoch - self.JOBS_RETENTION_DAYS * 86400
+        first_retained_day = retain_from - retain_from % 86400 + (86400 if retain_from % 86400 else 0)
+        start_day = max(end_day - days * 86400, first_retained_day)
+        stored_days = history_store.stored_days(self.project_id, self.region, start_day, end_day)
+        pending_days = [day for day in range(start_day, end_day, 86400) if day not in stored_days]
+        print(f"日別使用量の再構築: 対象 {(end_day - start_day) // 86400} 日 / 保存済み {len(stored_days)} 日 / "
+              f"取得 {len(pending_days)} 日", file=sys.stderr, flush=True)
+        
+        errors = []
+        stored_count = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_chunks) as executor:
+            futures = {executor.submit(self._fetch_daily_usage, day, deadline): day for day in pending_days}
+            try:
+                for future in as_completed(futures, timeout=deadline.remaining()):
+                    day = futures[future]
+                    day_label = datetime.utcfromtimestamp(day).date().isoformat()
+                    try:
+                        rows = future.result()
+                    except Exception as error:
+                        status = STATUS_TIMEOUT if isinstance(error, TIMEOUT_ERRORS) else STATUS_ERROR
+                        errors.append(UnitError(f"query:{day_label}", "backfill", status,
+                                                str(error) or "処理期限を超過").to_dict())
+                        continue
+                    history_store.store_daily_usage(self.project_id, self.region, day, rows)
+                    stored_count += 1
+                    print(f"日別使用量の再構築の進捗: {stored_count + len(errors)}/{len(pending_days)} 日 ({day_label})",
+                          file=sys.stderr, flush=True)
+            except TIMEOUT_ERRORS:
+                unfinished = [day for future, day in futures.items() if not future.done()]
+                for future in futures:
+                    future.cancel()
+                errors.extend(
+                    UnitError(f"query:{datetime.utcfromtimestamp(day).date().isoformat()}", "backfill",
+                              STATUS_TIMEOUT, "実行期限を超過したため未処理").to_dict()
+                    for day in unfinished
+                )
+        
+        return {
+            "project_id": self.project_id,
+            "region": self.region,
+            "start_date": datetime.utcfromtimestamp(start_day).date().isoformat(),
+            "end_date": datetime.utcfromtimestamp(end_day - 86400).date().isoformat(),
+            "days_requested": days,
+            "days_skipped": len(stored_days),
+            "days_stored": stored_count,
+            "complete": not errors,
+            "errors": errors,
+            "elapsed_seconds": round(time.monotonic() - started_at, 3),
+        }
+    
+    def _fetch_daily_usage(self, day_start: int, deadline: RunDeadline) -> List[Tuple[str, int, int]]:
+        """1日分のユーザー別使用量を取得（課金上限を超えた場合は範囲を分割）"""
+        range_start = datetime.utcfromtimestamp(day_start)
+        range_end = range_start + timedelta(days=1)
+        query_job = self._run_query(*self._build_daily_scan_query(range_start, range_end))
+        
+        user_totals = {}
+        for row in self._fetch_scan_rows(query_job, range_start, range_end, deadline,
+                                         query_builder=self._build_daily_scan_query):
+            bytes_processed, job_count = user_totals.get(row.user_email, (0, 0))
+            user_totals[row.user_email] = (
+                bytes_processed + (row.total_bytes_processed or 0),
+                job_count + (row.job_count or 0),
+            )
+        return [(email, bytes_processed, job_count) for email, (bytes_processed, job_count) in user_totals.items()]
+    
+    def _build_daily_scan_query(self, range_start: datetime, range_end: datetime) -> Tuple[str, List[Tuple[str, str, Any]]]:
+        """日別使用量の再構築で範囲を分割した際のSQLとクエリパラメータ"""
+        return self._build_daily_query(), [
+            ("range_start", "TIMESTAMP", range_start.replace(tzinfo=timezone.utc)),
+            ("range_end", "TIMESTAMP", range_end.replace(tzinfo=timezone.utc)),
+        ]
+    
+    def _build_daily_query(self) -> str:
+        """日別使用量の再構築用のSQLクエリを構築（範囲内のユーザー別合計とジョブ数）"""
+        return f"""
+        SELECT
+            user_email,
+            SUM(total_bytes_processed) as total_bytes_processed,
+            COUNT(*) as job_count
+        FROM
+            `{self.project_id}.region-{self.region}.INFORMATION_SCHEMA.JOBS_BY_PROJECT`
+        WHERE
+            creation_time >= @range_start
+            AND creation_time < @range_end
+            AND job_type = 'QUERY'
+            AND state = 'DONE'
+            AND total_bytes_processed IS NOT NULL
+            AND user_email IS NOT NULL
+        GROUP BY user_email
+        """
+    
+    def _plan_chunks(self, range_start: datetime, range_end: datetime) -> List[Tuple[datetime, datetime]]:
+        """chunk_secondsより長い走査範囲をchunk_seconds単位の境界（UTC）で区間に分割"""
+        if not self.chunk_seconds or (range_end - range_start).total_seconds() <= self.chunk_seconds:
+            return [(range_start, range_end)]
+        
+        chunks = []
+        start_epoch = int(self._to_epoch_seconds(range_start))
+        chunk_start = range_start
+        boundary = datetime.utcfromtimestamp(start_epoch - start_epoch % self.chunk_seconds + self.chunk_seconds)
+        while boundary < range_end:
+            chunks.append((chunk_start, boundary))
+            chunk_start = boundary
+            boundary += timedelta(seconds=self.chunk_seconds)
+        chunks.append((chunk_start, range_end))
+        return chunks
+    
+    def _submit_chunks(self, plan: ChunkedScanPlan) -> ChunkedScanPlan:
+        """
+        区間毎のクエリ文を組み立ててチェックポイントから完了済み区間を復元し、
+        未完了の区間のうち同時実行数の上限分のジョブを投入（ストレージ分析と並行して実行させるため）
+        """
+        for index, (chunk_start, chunk_end) in enumerate(plan.chunks):
+            query_statement, parameters = self._build_scan_query(chunk_start, chunk_end)
+            chunk_key = hashlib.sha256(repr((query_statement, parameters)).encode("utf-8")).hexdigest()
+            plan.queries.append((query_statement, parameters))
+            plan.chunk_keys.append(chunk_key)
+            stored_rows = self.checkpoint.load(chunk_key) if self.checkpoint is not None else None
+            if stored_rows is not None:
+                plan.restored_rows[index] = stored_rows
+            elif len(plan.submitted_jobs) < self.max_concurrent_chunks:
+                plan.submitted_jobs[index] = self._run_query(query_statement, parameters)
+        return plan
+    
+    def _collect_chunks(self, plan: ChunkedScanPlan, deadline: RunDeadline) -> List[Any]:
+        """区間毎のクエリジョブを同時実行数の上限内で実行し、結果を連結（完了済み区間はチェックポイントから再開）"""
+        rows_by_chunk = dict(plan.restored_rows)
+        chunk_keys = plan.chunk_keys
+        pending_chunks = [
+            (index, chunk_start, chunk_end) + plan.queries[index]
+            for index, (chunk_start, chunk_end) in enumerate(plan.chunks) if index not in rows_by_chunk
+        ]
+        
+        total_chunks = len(plan.chunks)
+        if rows_by_chunk:
+            print(f"クエリ走査をチェックポイントから再開: 完了済み {len(rows_by_chunk)}/{total_chunks} 区間",
+                  file=sys.stderr, flush=True)
+        
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_chunks) as executor:
+            # 投入済みの区間が先にワーカーへ割り当てられるよう、投入済みの区間から順に渡す
+            pending_chunks.sort(key=lambda chunk: chunk[0] not in plan.submitted_jobs)
+            futures = {
+                executor.submit(self._scan_chunk, chunk_start, chunk_end, query_statement, parameters, deadline,
+                                plan.submitted_jobs.pop(index, None)):
+                    (index, chunk_start, chunk_end)
+                for index, chunk_start, chunk_end, query_statement, parameters in pending_chunks
+            }
+            first_error = None
+            try:
+                for future in as_completed(futures, timeout=deadline.remaining()):
+                    index, chunk_start, chunk_end = futures[future]
+                    if future.cancelled():
+                        continue
+                    if future.exception() is not None:
+                        # 未着手の区間は取り消し、実行中の区間は完了を待ってチェックポイントに残す
+                        first_error = first_error or future.exception()
+                        for pending_future in futures:
+                            pending_future.cancel()
+                        continue
+                    rows_by_chunk[index] = future.result()
+                    if self.checkpoint is not None:
+                        self.checkpoint.store(chunk_keys[index], rows_by_chunk[index])
+                    print(f"クエリ走査の進捗: {len(rows_by_chunk)}/{total_chunks} 区間 "
+                          f"({chunk_start.isoformat()} 〜 {chunk_end.isoformat()})", file=sys.stderr, flush=True)
+            except BaseException as error:
+                # 期限切れ時は未着手の区間を取り消す（完了済み区間はチェックポイントに残る）
+                for future in futures:
+                    future.cancel()
+                if isinstance(error, TIMEOUT_ERRORS):
+                    raise TimeoutError(
+                        f"処理期限を超過（未完了区間 {total_chunks - len(rows_by_chunk)}/{total_chunks} 件）"
+                    ) from error
+                raise
+            if first_error is not None:
+                raise first_error
+        
+        if self.checkpoint is not None:
+            self.checkpoint.discard(chunk_keys)
+        return [row for index in range(total_chunks) for row in rows_by_chunk[index]]
+    
+    def _scan_chunk(self, chunk_start: datetime, chunk_end: datetime, query_statement: str,
+                    parameters: List[Tuple[str, str, Any]], deadline: RunDeadline,
+                    query_job: Optional[Any] = None) -> List[Any]:
+        """1区間のクエリジョブを投入（投入済みの場合はそのジョブを使用）して結果を取得"""
+        if query_job is None:
+            query_job = self._run_query(query_statement, parameters)
+        return self._fetch_scan_rows(query_job, chunk_start, chunk_end, deadline)
+    
+    def _run_query(self, query_statement: str, parameters: List[Tuple[str, str, Any]]) -> Any:
+        """パラメータ付きでクエリを投入"""
+        options = {}
+        if self.maximum_bytes_billed is not None:
+            options["maximum_bytes_billed"] = self.maximum_bytes_billed
+        if self.align_seconds:
+            # 同一区間内で同じクエリ文・パラメータとなるため、BigQueryのキャッシュ済み結果を利用できる
+            options["use_query_cache"] = True
+        return self.client.query(query_statement, job_config=self.job_config_factory.build(parameters, **options))
+    
+    def _fetch_scan_rows(self, query_job: Any, range_start: datetime, range_end: datetime,
+                         deadline: RunDeadline, query_builder: Optional[Any] = None) -> List[Any]:
+        """走査結果を取得（課金上限を超えた場合は範囲を二分して再実行し、結果を連結）"""
+        return list(self._iter_scan_rows(query_job, range_start, range_end, deadline, query_builder))
+    
+    def _iter_scan_rows(self, query_job: Any, range_start: datetime, range_end: datetime,
+                        deadline: RunDeadline, query_builder: Optional[Any] = None,
+                        on_split: Optional[Callable[[], None]] = None) -> Iterator[Any]:
+        """走査結果の行を順に返す（結果はページ単位で取得し、課金上限を超えた場合は範囲を二分して再実行）"""
+        try:
+            rows = self._wait_for_result(query_job, deadline)
+        except Exception as error:
+            if not self._is_bytes_limit_error(error):
+                raise
+            if (range_end - range_start).total_seconds() <= self.min_split_seconds:
+                raise
+            
+            middle_epoch = self._floor_to_bucket(range_start + (range_end - range_start) / 2)
+            middle = datetime.utcfromtimestamp(middle_epoch)
+            if middle <= range_start:
+                raise
+            print(f"課金バイト数の上限を超過したため走査範囲を分割: {range_start.isoformat()} 〜 "
+                  f"{middle.isoformat()} 〜 {range_end.isoformat()}", file=sys.stderr, flush=True)
+            if on_split is not None:
+                on_split()
+        else:
+            yield from rows
+            return
+        
+        query_builder = query_builder or self._build_scan_query
+        for chunk_start, chunk_end in ((range_start, middle), (middle, range_end)):
+            chunk_job = self._run_query(*query_builder(chunk_start, chunk_end))
+            yield from self._iter_scan_rows(chunk_job, chunk_start, chunk_end, deadline, query_builder, on_split)
+    
+    @staticmethod
+    def _is_bytes_limit_error(error: Exception) -> bool:
+        """maximum_bytes_billedの超過によるエラーかを判定"""
+        for detail in getattr(error, "errors", None) or []:
+            if isinstance(detail, dict) and detail.get("reason") == "bytesBilledLimitExceeded":
+                return True
+        message = str(error)
+        return "bytesBilledLimitExceeded" in message or "exceeded limit for bytes billed" in message.lower()
+    
+    def _remember_result(self, query_job: Any, rows: List[Any]) -> None:
+        """境界を揃えている場合、同一区間内の再実行に備えて結果を保持"""
+        if self.align_seconds and not isinstance(query_job, CachedQueryJob):
+            self._last_query_key = self._pending_query_key
+            self._last_query_rows = rows
+    
+    def _apply_incremental_rows(self, results: List[Any]) -> Dict[str, Any]:
+        """差分の部分集計をローカルに反映し、ローカル状態から集計期間毎に集計"""
+        self._store_incremental_rows(results)
+        window_starts, _ = self._pending_windows
+        return self._summarize_windows({
+            label: self.usage_store.sum_by_user(self.project_id, self.region, self._floor_to_bucket(start_time))
+            for label, start_time in window_starts.items()
+        })
+    
+    def _store_incremental_rows(self, results: List[Any]) -> None:
+        """差分の部分集計（ユーザー・分単位）をローカルに反映"""
+        scan_start, end_time = self._pending_scan
+        bucket_totals = {}
+        for row in results:
+            key = (row.bucket_start, row.user_email)
+            bucket_totals[key] = bucket_totals.get(key, 0) + (row.total_bytes_processed or 0)
+        
+        self.usage_store.replace_buckets(
+            self.project_id,
+            self.region,
+            int(self._to_epoch_seconds(scan_start)),
+            [(bucket_start, email, bytes_processed) for (bucket_start, email), bytes_processed in bucket_totals.items()],
+            self._to_epoch_seconds(end_time),
+            self._pending_retain_from
+        )
+    
+    def _stream_incremental_users(self, on_user: Callable[[Dict[str, Any], Optional[str]], None]) -> Dict[str, Any]:
+        """ローカル状態から集計期間毎のユーザー別合計を順に読み出してon_userに渡し、合計のみの集計結果を作成"""
+        window_starts, _ = self._pending_windows
+        window_bytes = {}
+        for label, start_time in window_starts.items():
+            if label != self.primary_window and not self.report_windows:
+                continue
+            window_bytes[label] = 0
+            for email, bytes_processed in self.usage_store.sum_by_user(
+                    self.project_id, self.region, self._floor_to_bucket(start_time)):
+                window_bytes[label] += bytes_processed
+                user = self._user_usage_to_dict(self._calculate_user_costs(email, bytes_processed))
+                if label == self.primary_window:
+                    on_user(user, None)
+                if self.report_windows:
+                    on_user(user, label)
+        return self._streamed_summary(window_bytes)
+    
+    def _stream_window_rows(self, query_job: Any, deadline: RunDeadline,
+                            on_user: Callable[[Dict[str, Any], Optional[str]], None]) -> Dict[str, Any]:
+        """
+        1回の走査の結果行（ユーザー毎に1行）を順に読みながらon_userに渡し、合計のみの集計結果を作成
+        課金上限の超過で範囲を分割した場合は同じユーザーが複数行になるため、全行を合算して集計する
+        """
+        scan_start, end_time = self._pending_scan
+        split = []
+        rows = self._iter_scan_rows(query_job, scan_start, end_time, deadline, on_split=lambda: split.append(True))
+        first_row = next(rows, None)
+        if split:
+            return self._process_window_results(itertools.chain([] if first_row is None else [first_row], rows))
+        
+        window_labels = [label for label, _ in self.windows]
+        window_bytes = dict.fromkeys(window_labels, 0)
+        for row in itertools.chain([] if first_row is None else [first_row], rows):
+            for index, label in enumerate(window_labels):
+                if not getattr(row, f"jobs_w{index}"):
+                    continue
+                bytes_processed = getattr(row, f"bytes_w{index}") or 0
+                window_bytes[label] += bytes_processed
+                user = self._user_usage_to_dict(self._calculate_user_costs(row.user_email, bytes_processed))
+                if label == self.primary_window:
+                    on_user(user, None)
+                if self.report_windows:
+                    on_user(user, label)
+        return self._streamed_summary(window_bytes)
+    
+    def _streamed_summary(self, window_bytes: Dict[str, int]) -> Dict[str, Any]:
+        """ユーザーを出力済みの場合の集計結果（期間毎の合計のみで、ユーザーの一覧は空）"""
+        return self._arrange_windows({
+            label: self._compile_query_summary([], total_bytes) for label, total_bytes in window_bytes.items()
+        })
+    
+    def _floor_to_bucket(self, value: datetime) -> int:
+        """UTCのdatetimeを部分集計の区切り（エポック秒）に切り捨て"""
+        epoch = int(self._to_epoch_seconds(value))
+        return epoch - epoch % QueryUsageStore.BUCKET_SECONDS
+    
+    @staticmethod
+    def _to_epoch_seconds(value: datetime) -> float:
+        """タイムゾーンなしのUTC datetimeをエポック秒に変換"""
+        return (value - datetime(1970, 1, 1)).total_seconds()
+    
+    def _build_incremental_query(self) -> str:
+        """差分取得用のSQLクエリを構築（ユーザー・分単位の部分集計）"""
+        return f"""
+        SELECT
+            UNIX_SECONDS(TIMESTAMP_TRUNC(creation_time, MINUTE)) as bucket_start,
+            user_email,
+            SUM(total_bytes_processed) as total_bytes_processed
+        FROM
+            `{self.project_id}.region-{self.region}.INFORMATION_SCHEMA.JOBS_BY_PROJECT`
+        WHERE
+            creation_time >= @range_start
+            AND creation_time < @range_end
+            AND job_type = 'QUERY'
+            AND state = 'DONE'
+            AND total_bytes_processed IS NOT NULL
+            AND user_email IS NOT NULL
+        GROUP BY bucket_start, user_email
+        """
+    
+    def _get_window_starts(self) -> Tuple[Dict[str, datetime], datetime]:
+        """集計期間毎の開始時刻と共通の終了時刻を取得"""
+        current_time = datetime.utcnow()
+        if self.align_seconds:
+            # 終了時刻を区間の境界に切り捨て、マイクロ秒を含まない決定的なクエリ文にする
+            current_epoch = int(self._to_epoch_seconds(current_time))
+            current_time = datetime.utcfromtimestamp(current_epoch - current_epoch % self.align_seconds)
+        window_starts = {label: current_time - length for label, length in self.windows}
+        return window_starts, current_time
+    
+    def _build_usage_query(self, window_count: int) -> str:
+        """使用量取得用のSQLクエリを構築（走査範囲を1回読み、期間毎に条件付き集計）"""
+        window_columns = ",\n".join(
+            f"            SUM(IF(creation_time >= @start_w{index}, total_bytes_processed, 0)) as bytes_w{index},\n"
+            f"            COUNTIF(creation_time >= @start_w{index}) as jobs_w{index}"
+            for index in range(window_count)
+        )
+        
+        if self.organization is not None:
+            project_filter = "\n            AND project_id IN UNNEST(@projects)" if self.organization_projects is not None else ""
+            return f"""
+        SELECT
+            project_id,
+            user_email,
+{window_columns}
+        FROM
+            `{self.project_id}.region-{self.region}.INFORMATION_SCHEMA.JOBS_BY_ORGANIZATION`
+        WHERE
+            creation_time >= @range_start
+            AND creation_time < @range_end
+            AND job_type = 'QUERY'
+            AND state = 'DONE'
+            AND total_bytes_processed IS NOT NULL
+            AND user_email IS NOT NULL{project_filter}
+        GROUP BY project_id, user_email
+        """
+        
+        return f"""
+        SELECT
+            user_email,
+{window_columns}
+        FROM
+            `{self.project_id}.region-{self.region}.INFORMATION_SCHEMA.JOBS_BY_PROJECT`
+        WHERE
+            creation_time >= @range_start
+            AND creation_time < @range_end
+            AND job_type = 'QUERY'
+            AND state = 'DONE'
+            AND total_bytes_processed IS NOT NULL
+            AND user_email IS NOT NULL
+        GROUP BY user_email
+        """
+    
+    def _process_window_results(self, results) -> Dict[str, Any]:
+        """期間毎の条件付き集計結果の処理（分割走査の結果はユーザー毎に合算）"""
+        window_count = len(self.windows)
+        user_sums = {}
+        for row in results:
+            bytes_per_window, jobs_per_window = user_sums.setdefault(
+                row.user_email, ([0] * window_count, [0] * window_count)
+            )
+            for index in range(window_count):
+                bytes_per_window[index] += getattr(row, f"bytes_w{index}") or 0
+                jobs_per_window[index] += getattr(row, f"jobs_w{index}") or 0
+        
+        window_totals = {}
+        for index, (label, _) in enumerate(self.windows):
+            window_totals[label] = [
+                (email, bytes_per_window[index])
+                for email, (bytes_per_window, jobs_per_window) in user_sums.items()
+                if jobs_per_window[index]
+            ]
+        return self._summarize_windows(window_totals)
+    
+    def merge_region_summaries(self, region_summaries: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """リージョン毎の集計結果をユーザー別に合算し、ユーザー毎・全体のリージョン別内訳を付加"""
+        user_regions = self._merge_user_regions(region_summaries)
+        merged = self._summarize_user_bytes(sorted(
+            ((email, sum(regions.values())) for email, regions in user_regions.items()),
+            key=lambda item: item[1], reverse=True
+        ))
+        for user in merged["users"]:
+            user["regions"] = user_regions[user["user_email"]]
+        
+        if self.report_windows:
+            merged["window"] = self.primary_window
+            merged["windows"] = {}
+            for label, _ in self.windows:
+                window_users = self._merge_user_regions({
+                    region: summary["windows"][label]
+                    for region, summary in region_summaries.items() if "windows" in summary
+                })
+                window_summary = self._summarize_user_bytes(sorted(
+                    ((email, sum(regions.values())) for email, regions in window_users.items()),
+                    key=lambda item: item[1], reverse=True
+                ))
+                merged["windows"][label] = {
+                    key: value for key, value in window_summary.items()
+                    if key in ("users", "total_bytes_processed", "total_tb_processed", "total_cost_usd", "total_cost_jpy")
+                }
+        
+        merged["regions"] = {
+            region: {
+                key: value for key, value in summary.items()
+                if key in ("total_bytes_processed", "total_tb_processed", "total_cost_usd", "total_cost_jpy",
+                           "complete", "elapsed_seconds")
+            }
+            for region, summary in region_summaries.items()
+        }
+        merged["complete"] = all(summary["complete"] for summary in region_summaries.values())
+        merged["errors"] = [
+            dict(error, unit=f"{error['unit']}:{region}")
+            for region, summary in region_summaries.items() for error in summary["errors"]
+        ]
+        merged["elapsed_seconds"] = max(summary["elapsed_seconds"] for summary in region_summaries.values())
+        return merged
+    
+    @staticmethod
+    def _merge_user_regions(region_summaries: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+        """リージョン毎の集計結果からユーザー毎のリージョン別処理バイト数を作成"""
+        user_regions = {}
+        for region, summary in region_summaries.items():
+            for user in summary["users"]:
+                user_regions.setdefault(user["user_email"], {})[region] = user["bytes_processed"]
+        return user_regions
+    
+    def _summarize_windows(self, window_totals: Dict[str, Any]) -> Dict[str, Any]:
+        """期間毎の(メールアドレス, 処理バイト数)からサマリーを作成（主期間の結果を最上位に配置）"""
+        return self._arrange_windows({
+            label: self._summarize_user_bytes(sorted(user_totals, key=lambda item: item[1], reverse=True))
+            for label, user_totals in window_totals.items()
+        })
+    
+    def _arrange_windows(self, window_summaries: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """期間毎のサマリーのうち主期間の結果を最上位に配置し、query.windows指定時は期間毎の結果を付加"""
+        summary = window_summaries[self.primary_window]
+        if self.report_windows:
+            summary["window"] = self.primary_window
+            summary["windows"] = {
+                label: {
+                    key: value for key, value in window_summary.items()
+                    if key in ("users", "total_bytes_processed", "total_tb_processed", "total_cost_usd", "total_cost_jpy")
+                }
+                for label, window_summary in window_summaries.items()
+            }
+        return summary
+    
+    def _summarize_user_bytes(self, user_totals) -> Dict[str, Any]:
+        """(メールアドレス, 処理バイト数)の並びからサマリーを作成"""
+        user_usages = []
+        grand_total_bytes = 0
+        
+        for email, processed_bytes in user_totals:
+            grand_total_bytes += processed_bytes
+            
+            user_usage = self._calculate_user_costs(email, processed_bytes)
+            user_usages.append(user_usage)
+        
+        return self._compile_query_summary(user_usages, grand_total_bytes)
+    
+    def _calculate_user_costs(self, email: str, bytes_processed: int) -> UserQueryUsage:
+        """ユーザー別のクエリコスト計算"""
+        tb_processed = bytes_processed / (1024 ** 4)
+        cost_usd = tb_processed * self.QUERY_RATE_USD_PER_TB
+        cost_jpy = cost_usd * self.USD_TO_JPY_RATE
+        
+        return UserQueryUsage(
+            user_email=email,
             bytes_processed=bytes_processed,
             tb_processed=round(tb_processed, 6),
             cost_usd=round(cost_usd, 2),
             cost_jpy=round(cost_jpy, 2)
         )
     
+    @staticmethod
+    def _user_usage_to_dict(usage: UserQueryUsage) -> Dict[str, Any]:
+        """ユーザー別使用量を出力用の辞書に変換"""
+        return {
+            "user_email": usage.user_email,
+            "bytes_processed": usage.bytes_processed,
+            "tb_processed": usage.tb_processed,
+            "cost_usd": usage.cost_usd,
+            "cost_jpy": usage.cost_jpy,
+        }
+    
     def _compile_query_summary(self, usages: List[UserQueryUsage], total_bytes: int) -> Dict[str, Any]:
         """クエリ使用量サマリーの作成"""
         total_tb = total_bytes / (1024 ** 4)
@@ -277,20 +2459,14 @@ class QueryAnalyzer:
         total_cost_jpy = total_cost_usd * self.USD_TO_JPY_RATE
         
         return {
-            "users": [
-                {
-                    "user_email": usage.user_email,
-                    "bytes_processed": usage.bytes_processed,
-                    "tb_processed": usage.tb_processed,
-                    "cost_usd": usage.cost_usd,
-                    "cost_jpy": usage.cost_jpy,
-                }
-                for usage in usages
-            ],
+            "users": [self._user_usage_to_dict(usage) for usage in usages],
             "total_bytes_processed": total_bytes,
             "total_tb_processed": round(total_tb, 6),
             "total_cost_usd": round(total_cost_usd, 2),
             "total_cost_jpy": round(total_cost_jpy, 2),
+            "complete": True,
+            "errors": [],
+            "elapsed_seconds": 0.0,
         }
 
 
@@ -298,43 +2474,1077 @@ class UsageReporter:
     """使用量レポート生成クラス"""
     
     @staticmethod
-    def generate_report(storage_analysis: Dict[str, Any], query_analysis: Dict[str, Any]) -> Dict[str, Any]:
+    def generate_report(storage_analysis: Dict[str, Any], query_analysis: Dict[str, Any],
+                        meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """統合レポートの生成"""
-        return {
+        report = {
             "storage": storage_analysis,
             "query": query_analysis
         }
+        if meta:
+            report["_meta"] = meta
+        return report
+    
+    @staticmethod
+    def merge_project_reports(project_reports: Dict[str, Dict[str, Any]], errors: List[Dict[str, Any]],
+                              elapsed_seconds: float) -> Dict[str, Any]:
+        """プロジェクト毎のレポートを1つのレポートに統合（合計はプロジェクト横断）"""
+        storage_summaries = [report["storage"] for report in project_reports.values()]
+        query_summaries = [report["query"] for report in project_reports.values()]
+        return {
+            "projects": project_reports,
+            "summary": {
+                "project_count": len(project_reports) + len(errors),
+                "total_storage_size_bytes": sum(summary["total_size_bytes"] for summary in storage_summaries),
+                "total_storage_cost_usd": round(sum(summary["total_cost_usd"] for summary in storage_summaries), 2),
+                "total_storage_cost_jpy": round(sum(summary["total_cost_jpy"] for summary in storage_summaries), 2),
+                "total_query_bytes_processed": sum(summary["total_bytes_processed"] for summary in query_summaries),
+                "total_query_cost_usd": round(sum(summary["total_cost_usd"] for summary in query_summaries), 2),
+                "total_query_cost_jpy": round(sum(summary["total_cost_jpy"] for summary in query_summaries), 2),
+            },
+            "_meta": {
+                "complete": not errors and all(report["_meta"]["complete"] for report in project_reports.values()),
+                "errors": errors,
+                "elapsed_seconds": round(elapsed_seconds, 3),
+            },
+        }
     
     @staticmethod
-    def output_report(report_data: Dict[str, Any]) -> None:
+    def append_metrics_file(metrics_path: str, instrumentation_snapshot: Dict[str, Any]) -> None:
+        """計測値をJSON Lines形式で追記"""
+        try:
+            metrics_file = Path(metrics_path)
+            metrics_file.parent.mkdir(parents=True, exist_ok=True)
+            record = {"timestamp": datetime.utcnow().isoformat() + "Z", "instrumentation": instrumentation_snapshot}
+            with metrics_file.open("a", encoding="utf-8") as file:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception as error:
+            print(f"計測値の書き込みでエラーが発生: {error}", file=sys.stderr, flush=True)
+    
+    @staticmethod
+    def output_report(report_data: Dict[str, Any], output_format: str = "json") -> None:
         """レポートの標準出力への出力"""
-        json_output = json.dumps(report_data, ensure_ascii=False, indent=2)
-        print(json_output, flush=True)
+        if output_format == "ndjson":
+            NdjsonReportWriter().write_report(report_data)
+            return
+        ReportSerializer.write(report_data, output_format)
 
 
-def execute_monitoring():
-    """メイン実行フロー"""
-    # 設定の読み込み
-    config = ConfigurationManager.load_config("settings.json")
+class ReportSerializer:
+    """
+    レポートの形式毎のシリアライズ
+    JSONの変換にはorjsonが利用可能であれば使用し、表形式（csv, arrow, parquet）では
+    DatasetUsage/UserQueryUsageの項目を列とする1つの表（record_typeでデータセット・ユーザーを区別）に変換する
+    """
+    
+    FORMATS = ("json", "json-compact", "ndjson", "csv", "arrow", "parquet")
+    # pyarrowが必要な形式
+    ARROW_FORMATS = ("arrow", "parquet")
+    # 表形式の列（名前, Arrowの型）。DatasetUsage・UserQueryUsageの項目に出力元の区別を加えたもの
+    TABLE_COLUMNS = (
+        ("record_type", "string"),
+        ("project_id", "string"),
+        ("window", "string"),
+        ("dataset_id", "string"),
+        ("user_email", "string"),
+        ("size_bytes", "int64"),
+        ("size_gb", "float64"),
+        ("size_tb", "float64"),
+        ("bytes_processed", "int64"),
+        ("tb_processed", "float64"),
+        ("cost_usd", "float64"),
+        ("cost_jpy", "float64"),
+        ("status", "string"),
+        ("error_phase", "string"),
+        ("error", "string"),
+        ("elapsed_seconds", "float64"),
+    )
+    
+    _orjson = None
+    _orjson_loaded = False
+    
+    @classmethod
+    def _load_orjson(cls) -> Optional[Any]:
+        """orjsonを読み込む（未インストールの場合はNone、結果は保持して再試行しない）"""
+        if not cls._orjson_loaded:
+            try:
+                import orjson
+                cls._orjson = orjson
+            except ImportError:
+                cls._orjson = None
+            cls._orjson_loaded = True
+        return cls._orjson
+    
+    @classmethod
+    def dumps(cls, data: Any, pretty: bool = False) -> str:
+        """JSON文字列に変換（prettyの場合はインデント2、それ以外は区切りの空白なし）"""
+        orjson = cls._load_orjson()
+        if orjson is not None:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0).decode("utf-8")
+        if pretty:
+            return json.dumps(data, ensure_ascii=False, indent=2)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    
+    @classmethod
+    def ensure_available(cls, output_format: str) -> None:
+        """出力形式に必要なライブラリの確認（不足している場合は設定エラーとして終了）"""
+        if output_format in cls.ARROW_FORMATS:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                print(f"設定エラー: --format {output_format}にはpyarrowが必要です（pip install pyarrow）",
+                      file=sys.stderr, flush=True)
+                sys.exit(101)
+    
+    @classmethod
+    def iter_table_rows(cls, report: Dict[str, Any], project_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """レポートからデータセット・ユーザー（集計期間毎を含む）の行を順に取り出す"""
+        if "projects" in report:
+            for report_project_id, project_report in report["projects"].items():
+                yield from cls.iter_table_rows(project_report, report_project_id)
+            return
+        for dataset in report.get("storage", {}).get("datasets", []):
+            yield dict(dataset, record_type="dataset", project_id=project_id)
+        query = report.get("query", {})
+        for user in query.get("users", []):
+            yield dict(user, record_type="user", project_id=project_id, window=query.get("window"))
+        for label, window_summary in query.get("windows", {}).items():
+            for user in window_summary["users"]:
+                yield dict(user, record_type="window_user", project_id=project_id, window=label)
+    
+    @classmethod
+    def write(cls, report: Dict[str, Any], output_format: str = "json", stream: Optional[Any] = None) -> None:
+        """レポートを指定の形式で書き込む（arrow, parquetは標準出力のバイナリストリームへ）"""
+        if output_format in cls.ARROW_FORMATS:
+            cls.write_arrow(report, output_format, stream or sys.stdout.buffer)
+        elif output_format == "csv":
+            cls.write_csv(report, stream or sys.stdout)
+        else:
+            stream = stream or sys.stdout
+            stream.write(cls.dumps(report, pretty=output_format == "json") + "\n")
+            stream.flush()
+        
+        # 表形式には合計・完了状態を含めないため、未完了の場合は標準エラー出力で通知する
+        if output_format in ("csv",) + cls.ARROW_FORMATS and not report.get("_meta", {}).get("complete", True):
+            print("警告: 未完了の処理単位を含むレポートです（失敗の内容は--format jsonで確認できます）",
+                  file=sys.stderr, flush=True)
+    
+    @classmethod
+    def write_csv(cls, report: Dict[str, Any], stream: Any) -> None:
+        """表形式の行をCSV（ヘッダー付き）で書き込む"""
+        writer = csv.DictWriter(stream, fieldnames=[name for name, _ in cls.TABLE_COLUMNS],
+                                extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(cls.iter_table_rows(report))
+        stream.flush()
+    
+    @classmethod
+    def write_arrow(cls, report: Dict[str, Any], output_format: str, sink: Any) -> None:
+        """表形式の行をArrow IPCストリームまたはParquetで書き込む"""
+        import pyarrow
+        
+        schema = pyarrow.schema([(name, getattr(pyarrow, type_name)()) for name, type_name in cls.TABLE_COLUMNS])
+        columns = {name: [] for name, _ in cls.TABLE_COLUMNS}
+        for row in cls.iter_table_rows(report):
+            for name in columns:
+                columns[name].append(row.get(name))
+        table = pyarrow.Table.from_pydict(columns, schema=schema)
+        
+        if output_format == "parquet":
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(table, sink)
+        else:
+            import pyarrow.ipc
+            with pyarrow.ipc.new_stream(sink, schema) as writer:
+                writer.write_table(table)
+        sink.flush()
+
+
+class NdjsonReportWriter:
+    """
+    NDJSON形式のレポート出力（1レコード1行で、書き込み毎にフラッシュ）
+    各行はtype（dataset, user, window_user, storage, query, summary, meta）を持ち、
+    複数プロジェクトの場合はproject_idも持つ。storage/queryの行にはdatasets/usersの一覧を含めない
+    """
+    
+    def __init__(self, stream: Optional[Any] = None):
+        self.stream = stream or sys.stdout
+        # 並列に完了したデータセットの結果を行単位で書き込むため排他する
+        self._lock = threading.Lock()
+    
+    def write(self, record_type: str, record: Dict[str, Any], project_id: Optional[str] = None) -> None:
+        """1レコードを1行として書き込む"""
+        line = {"type": record_type}
+        if project_id is not None:
+            line["project_id"] = project_id
+        line.update(record)
+        text = ReportSerializer.dumps(line) + "\n"
+        with self._lock:
+            self.stream.write(text)
+            self.stream.flush()
+    
+    def write_user(self, user: Dict[str, Any], window: Optional[str] = None, project_id: Optional[str] = None) -> None:
+        """ユーザー1人分の使用量を書き込む（windowを指定した場合は集計期間毎の行）"""
+        if window is None:
+            self.write("user", user, project_id)
+        else:
+            self.write("window_user", dict(user, window=window), project_id)
+    
+    def write_dataset(self, usage: DatasetUsage, project_id: Optional[str] = None) -> None:
+        """データセット1件分の使用量を書き込む"""
+        self.write("dataset", StorageAnalyzer._dataset_usage_to_dict(usage), project_id)
+    
+    def write_storage(self, storage_results: Dict[str, Any], project_id: Optional[str] = None,
+                      include_datasets: bool = False) -> None:
+        """ストレージ使用量の合計を書き込む（include_datasetsの場合は先にデータセット毎の行を書き込む）"""
+        if include_datasets:
+            for dataset in storage_results["datasets"]:
+                self.write("dataset", dataset, project_id)
+        self.write("storage", {key: value for key, value in storage_results.items() if key != "datasets"}, project_id)
+    
+    def write_query(self, query_results: Dict[str, Any], project_id: Optional[str] = None) -> None:
+        """ユーザー毎の行（集計期間毎を含む）に続けてクエリ使用量の合計を書き込む"""
+        for user in query_results["users"]:
+            self.write_user(user, project_id=project_id)
+        summary = {key: value for key, value in query_results.items() if key not in ("users", "windows")}
+        if "windows" in query_results:
+            summary["windows"] = {}
+            for label, window_summary in query_results["windows"].items():
+                for user in window_summary["users"]:
+                    self.write_user(user, label, project_id)
+                summary["windows"][label] = {key: value for key, value in window_summary.items() if key != "users"}
+        self.write("query", summary, project_id)
+    
+    def write_report(self, report: Dict[str, Any], project_id: Optional[str] = None) -> None:
+        """作成済みのレポート（複数プロジェクトの統合レポートを含む）を行単位に分けて書き込む"""
+        if "projects" in report:
+            for report_project_id, project_report in report["projects"].items():
+                self.write_report(project_report, report_project_id)
+            self.write_summary(report)
+            return
+        if "storage" in report:
+            self.write_storage(report["storage"], project_id, include_datasets=True)
+        if "query" in report:
+            self.write_query(report["query"], project_id)
+        if "_meta" in report:
+            self.write("meta", report["_meta"], project_id)
+    
+    def write_summary(self, merged_report: Dict[str, Any]) -> None:
+        """統合レポートのプロジェクト横断の合計と完了状態を書き込む"""
+        self.write("summary", merged_report["summary"])
+        self.write("meta", merged_report["_meta"])
+
+
+class MetricsExporter:
+    """Prometheusテキスト形式のメトリクスをHTTPで公開するクラス"""
+    
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    
+    def __init__(self, project_id: str, host: str = "127.0.0.1", port: int = 9464):
+        self.project_id = project_id
+        self.host = host
+        self.port = port
+        self._payload = b""
+        self._server = None
+        self._thread = None
+    
+    def update(self, report: Dict[str, Any]) -> None:
+        """レポートからメトリクスを生成してスナップショットを差し替え"""
+        self._payload = self.render(report, self.project_id).encode("utf-8")
+    
+    @staticmethod
+    def render(report: Dict[str, Any], project_id: str) -> str:
+        """レポートをPrometheusテキスト形式に変換"""
+        lines = []
+        
+        def add_metric(name: str, help_text: str, samples: List[Tuple[Dict[str, str], Any]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                label_text = ",".join(
+                    f'{key}="{MetricsExporter._escape_label(str(label_value))}"'
+                    for key, label_value in labels.items()
+                )
+                lines.append(f"{name}{{{label_text}}} {value}")
+        
+        # 取得に失敗した値は0として出力せずに省き、取得できたかどうかは*_completeで表す
+        project_labels = {"project_id": project_id}
+        storage = report.get("storage", {})
+        datasets = storage.get("datasets", [])
+        storage_complete = storage.get("complete", False)
+        dataset_ok = {usage["dataset_id"]: usage.get("status", STATUS_OK) == STATUS_OK for usage in datasets}
+        ok_datasets = [usage for usage in datasets if dataset_ok[usage["dataset_id"]]]
+        add_metric(
+            "bigquery_dataset_complete", "Whether the dataset storage size was fetched (1) or failed (0).",
+            [({**project_labels, "dataset_id": dataset_id}, int(ok)) for dataset_id, ok in dataset_ok.items()]
+        )
+        add_metric(
+            "bigquery_dataset_size_bytes", "Dataset storage size in bytes.",
+            [({**project_labels, "dataset_id": usage["dataset_id"]}, usage["size_bytes"]) for usage in ok_datasets]
+        )
+        add_metric(
+            "bigquery_dataset_storage_cost_usd", "Estimated monthly storage cost of the dataset in USD.",
+            [({**project_labels, "dataset_id": usage["dataset_id"]}, usage["cost_usd"]) for usage in ok_datasets]
+        )
+        add_metric(
+            "bigquery_storage_complete", "Whether the storage sizes of all monitored datasets were fetched.",
+            [(project_labels, int(storage_complete))]
+        )
+        add_metric(
+            "bigquery_storage_size_bytes", "Total storage size of the monitored datasets in bytes.",
+            [(project_labels, storage.get("total_size_bytes", 0))] if storage_complete else []
+        )
+        add_metric(
+            "bigquery_storage_cost_usd", "Estimated monthly storage cost of the monitored datasets in USD.",
+            [(project_labels, storage.get("total_cost_usd", 0))] if storage_complete else []
+        )
+        
+        # クエリ使用量は主集計期間（query.windows未指定時は24h）の値のため、期間をラベルとヘルプに含める
+        query = report.get("query", {})
+        query_complete = query.get("complete", False)
+        users = query.get("users", []) if query_complete else []
+        window = query.get("window", QueryAnalyzer.PRIMARY_WINDOW)
+        window_labels = {**project_labels, "window": window}
+        add_metric(
+            "bigquery_query_complete", f"Whether the query usage in the last {window} was fully scanned.",
+            [(window_labels, int(query_complete))]
+        )
+        add_metric(
+            "bigquery_user_bytes_processed", f"Bytes processed by the user's queries in the last {window}.",
+            [({**window_labels, "user_email": usage["user_email"]}, usage["bytes_processed"]) for usage in users]
+        )
+        add_metric(
+            "bigquery_user_query_cost_usd", f"Estimated query cost of the user in the last {window} in USD.",
+            [({**window_labels, "user_email": usage["user_email"]}, usage["cost_usd"]) for usage in users]
+        )
+        add_metric(
+            "bigquery_query_bytes_processed", f"Total bytes processed by queries in the last {window}.",
+            [(window_labels, query.get("total_bytes_processed", 0))] if query_complete else []
+        )
+        add_metric(
+            "bigquery_query_cost_usd", f"Estimated total query cost in the last {window} in USD.",
+            [(window_labels, query.get("total_cost_usd", 0))] if query_complete else []
+        )
+        add_metric(
+            "bigquery_usage_last_refresh_timestamp_seconds", "Unix time when the snapshot was refreshed.",
+            [(project_labels, round(time.time(), 3))]
+        )
+        return "\n".join(lines) + "\n"
+    
+    @staticmethod
+    def _escape_label(value: str) -> str:
+        """ラベル値のエスケープ"""
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
     
-    # BigQueryクライアントの初期化
+    def start(self) -> None:
+        """HTTPサーバーをバックグラウンドで起動"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        exporter = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = exporter._payload
+                self.send_response(200)
+                self.send_header("Content-Type", MetricsExporter.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def log_message(self, format, *args):
+                # アクセスログは出力しない
+                pass
+        
+        self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-exporter", daemon=True)
+        self._thread.start()
+    
+    def shutdown(self) -> None:
+        """HTTPサーバーを停止"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class MonitoringService:
+    """監視サービス（クライアントと分析器を保持し、単発実行と常駐実行を提供）"""
+    
+    # 常駐モードの既定の実行間隔（秒）
+    DEFAULT_STORAGE_INTERVAL_SECONDS = 3600
+    DEFAULT_QUERY_INTERVAL_SECONDS = 900
+    # 失敗した処理単位の再試行回数
+    DEFAULT_RETRY_FAILED_ROUNDS = 1
+    
+    def __init__(self, config: Dict[str, Any], client: "bigquery.Client"):
+        self.config = config
+        run_config = config.get("run", {})
+        self.deadline_seconds = run_config.get("deadline_seconds")
+        self.retry_failed_rounds = run_config.get("retry_failed_rounds", self.DEFAULT_RETRY_FAILED_ROUNDS)
+        
+        instrumentation_config = config.get("instrumentation", {})
+        self.instrumentation = None
+        self.metrics_file = instrumentation_config.get("metrics_file")
+        if instrumentation_config.get("enabled"):
+            self.instrumentation = ApiInstrumentation()
+            client = InstrumentedClient(client, self.instrumentation)
+        self.client = client
+        
+        retry_config = config.get("retry", {})
+        self.retry_policy = RetryPolicy(retry_config) if retry_config.get("enabled", True) else None
+        self.storage_analyzer = StorageAnalyzer(
+            client,
+            config["project_id"],
+            config["region"],
+            config.get("storage")
+        )
+        # organization.enabledの場合は組織全体のビューからプロジェクト別に集計する
+        self.organization = None
+        if config.get("organization", {}).get("enabled"):
+            self.organization = config["organization"]
+        # query.regionsを指定した場合はリージョン毎に分析器を用意し、並列に取得して統合する
+        query_regions = config.get("query", {}).get("regions", [config["region"]])
+        self.query_analyzers = {
+            region: QueryAnalyzer(client, config["project_id"], region, config.get("query"), self.organization)
+            for region in query_regions
+        }
+        self.query_analyzer = self.query_analyzers[query_regions[0]]
+        self.history_config = config.get("history", {})
+        self.history_store = None
+        if self.history_config.get("record"):
+            self.history_store = HistoryStore.from_config(self.history_config)
+        
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._storage_results = None
+        self._query_results = None
+        # 常駐モードのレポート出力形式（json, ndjson）
+        self.output_format = "json"
+        
+        self.exporter = None
+        exporter_config = config.get("exporter", {})
+        if exporter_config.get("port") is not None:
+            self.exporter = MetricsExporter(
+                config["project_id"],
+                exporter_config.get("host", "127.0.0.1"),
+                exporter_config["port"]
+            )
+    
+    def collect_once(self, writer: Optional[NdjsonReportWriter] = None) -> Optional[Dict[str, Any]]:
+        """
+        ストレージとクエリの使用量を1回取得してレポートを生成
+        writerを指定した場合は、データセット・ユーザー毎の行を算出され次第書き込み、全体のレポートは作成しない（Noneを返す）
+        """
+        if self.organization is not None:
+            report = self.collect_organization()
+            if writer is not None:
+                writer.write_report(report)
+            return report
+        deadline = RunDeadline(self.deadline_seconds)
+        self._bind_deadline(self.storage_analyzer, deadline)
+        for query_analyzer in self.query_analyzers.values():
+            self._bind_deadline(query_analyzer, deadline)
+        
+        # クエリ使用量の取得ジョブを先に投入し、実行中にストレージ分析を進める
+        query_jobs = {
+            region: query_analyzer.submit_recent_queries() for region, query_analyzer in self.query_analyzers.items()
+        }
+        
+        # ストレージ使用量の分析
+        storage_results = self._analyze_storage(deadline, writer.write_dataset if writer is not None else None)
+        if writer is not None:
+            writer.write_storage(storage_results)
+        
+        # クエリ使用量の集計（ユーザー別の合算が不要な場合は、結果行から算出したユーザーを順に書き込む）
+        on_user = None
+        if writer is not None and len(query_jobs) == 1 and self.history_store is None:
+            on_user = writer.write_user
+        query_results = self._collect_queries(query_jobs, deadline, on_user)
+        if writer is not None:
+            writer.write_query(query_results)
+        
+        self._record_history(storage_results, query_results)
+        
+        if writer is not None:
+            writer.write("meta", self._build_meta(storage_results, query_results))
+            return None
+        with self._lock:
+            self._storage_results = storage_results
+            self._query_results = query_results
+        return UsageReporter.generate_report(storage_results, query_results,
+                                             self._build_meta(storage_results, query_results))
+    
+    def collect_organization(self) -> Dict[str, Any]:
+        """組織モード: 組織全体の使用量を1回取得し、プロジェクト毎のレポートに振り分けて統合"""
+        started_at = time.monotonic()
+        deadline = RunDeadline(self.deadline_seconds)
+        self._bind_deadline(self.storage_analyzer, deadline)
+        for query_analyzer in self.query_analyzers.values():
+            self._bind_deadline(query_analyzer, deadline)
+        
+        query_jobs = {
+            region: query_analyzer.submit_recent_queries() for region, query_analyzer in self.query_analyzers.items()
+        }
+        
+        # 組織単位のビューの取得失敗はプロジェクト単位に分けられないため、統合レポートの_meta.errorsに記録する
+        errors = []
+        try:
+            project_datasets = self.storage_analyzer.analyze_organization_usages(
+                self.organization, list(self.query_analyzers)
+            )
+        except Exception as error:
+            print(f"組織のストレージ使用量の取得でエラーが発生: {error}", file=sys.stderr, flush=True)
+            errors.append(UnitError("organization:storage", "query", STATUS_ERROR, str(error)).to_dict())
+            project_datasets = None
+        storage_elapsed = time.monotonic() - started_at
+        
+        region_summaries = {}
+        for region, query_job in query_jobs.items():
+            try:
+                region_summaries[region] = self.query_analyzers[region].collect_organization_queries(query_job, deadline)
+            except Exception as error:
+                print(f"組織のクエリ使用量の取得でエラーが発生（{region}）: {error}", file=sys.stderr, flush=True)
+                errors.append(UnitError(f"organization:query:{region}", "collect", STATUS_ERROR, str(error)).to_dict())
+                region_summaries[region] = None
+        
+        project_ids = self.organization.get("projects")
+        if project_ids is None:
+            project_ids = set(project_datasets or {})
+            for summaries in region_summaries.values():
+                project_ids.update(summaries or {})
+            project_ids = sorted(project_ids)
+        
+        project_reports = {}
+        for project_id in project_ids:
+            storage_results = self.storage_analyzer.compile_storage_summary(
+                (project_datasets or {}).get(project_id, []), storage_elapsed
+            )
+            storage_results["complete"] = project_datasets is not None
+            
+            project_summaries = {}
+            for region, summaries in region_summaries.items():
+                summary = (summaries or {}).get(project_id) or self.query_analyzers[region].empty_summary()
+                summary["complete"] = summaries is not None
+                project_summaries[region] = summary
+            if len(project_summaries) == 1:
+                query_results = next(iter(project_summaries.values()))
+            else:
+                query_results = self.query_analyzer.merge_region_summaries(project_summaries)
+            
+            self._record_history(storage_results, query_results, project_id)
+            project_reports[project_id] = UsageReporter.generate_report(
+                storage_results, query_results, {"complete": storage_results["complete"] and query_results["complete"]}
+            )
+        
+        merged = UsageReporter.merge_project_reports(project_reports, [], time.monotonic() - started_at)
+        merged["_meta"]["complete"] = merged["_meta"]["complete"] and not errors
+        merged["_meta"]["errors"] = errors
+        self._attach_instrumentation(merged["_meta"])
+        return merged
+    
+    def _record_history(self, storage_results: Optional[Dict[str, Any]] = None,
+                        query_results: Optional[Dict[str, Any]] = None, project_id: Optional[str] = None) -> None:
+        """取得結果を履歴に追加（取得に失敗したデータセット・未完了のクエリ集計は記録しない）"""
+        if self.history_store is None:
+            return
+        project_id = project_id or self.config["project_id"]
+        ts = int(time.time())
+        try:
+            if storage_results is not None:
+                self.history_store.append_storage(project_id, ts, [
+                    (dataset["dataset_id"], dataset["size_bytes"])
+                    for dataset in storage_results["datasets"] if dataset["status"] == STATUS_OK
+                ])
+            if query_results is not None and query_results["complete"]:
+                # 複数リージョンの場合はユーザー毎のリージョン別内訳からリージョン毎に記録する
+                region_users = {region: [] for region in self.query_analyzers}
+                for user in query_results["users"]:
+                    user_regions = user.get("regions", {self.query_analyzer.region: user["bytes_processed"]})
+                    for region, bytes_processed in user_regions.items():
+                        region_users[region].append((user["user_email"], bytes_processed))
+                for region, users in region_users.items():
+                    self.history_store.append_query(
+                        project_id, region, self.query_analyzer.primary_window, ts, users
+                    )
+            # 完了した区間のみを集約するため、毎回実行しても増分の処理になる
+            self.history_store.compact(project_id)
+        except Exception as error:
+            # 履歴の記録に失敗してもレポートの出力は継続する
+            print(f"履歴の記録でエラーが発生: {error}", file=sys.stderr, flush=True)
+    
+    def backfill(self, days: Optional[int] = None) -> Dict[str, Any]:
+        """JOBSビューの保持期間内の日別使用量を履歴に再構築（保存済みの日は取得しない）"""
+        days = days or self.history_config.get("backfill_days", QueryAnalyzer.JOBS_RETENTION_DAYS)
+        history_store = self.history_store or HistoryStore.from_config(self.history_config)
+        # 長時間の処理になるため実行期限は適用しない（中断後の再実行で未取得の日から再開する）
+        deadline = RunDeadline()
+        region_results = {}
+        for region, query_analyzer in self.query_analyzers.items():
+            self._bind_deadline(query_analyzer, deadline)
+            region_results[region] = query_analyzer.backfill_daily_usage(history_store, days, deadline)
+        if len(region_results) == 1:
+            return region_results[self.query_analyzer.region]
+        return {
+            "project_id": self.config["project_id"],
+            "regions": region_results,
+            "complete": all(result["complete"] for result in region_results.values()),
+        }
+    
+    def _bind_deadline(self, analyzer: Any, deadline: RunDeadline) -> None:
+        """分析器のAPI呼び出しに再試行方針と今回の実行期限を適用"""
+        if self.retry_policy is not None:
+            analyzer.client = RetryingClient(self.client, self.retry_policy, deadline, self.instrumentation)
+    
+    def _analyze_storage(self, deadline: RunDeadline,
+                         on_usage: Optional[Callable[[DatasetUsage], None]] = None) -> Dict[str, Any]:
+        """ストレージ使用量を取得し、期限内であれば失敗したデータセットのみ再試行"""
+        started_at = time.monotonic()
+        # 失敗したデータセットは再試行で結果が置き換わるため、on_usageへは再試行を終えてから渡す
+        on_success = None
+        if on_usage is not None:
+            on_success = lambda usage: on_usage(usage) if usage.status == STATUS_OK else None  # noqa: E731
+        usages = self.storage_analyzer.analyze_dataset_usages(self.config["datasets"], deadline, on_success)
+        
+        for _ in range(self.retry_failed_rounds):
+            failed_datasets = [usage.dataset_id for usage in usages if usage.status != STATUS_OK]
+            if not failed_datasets or deadline.expired():
+                break
+            print(f"失敗したデータセットを再試行: {', '.join(failed_datasets)}", file=sys.stderr, flush=True)
+            retried = {
+                usage.dataset_id: usage
+                for usage in self.storage_analyzer.analyze_dataset_usages(failed_datasets, deadline, on_success)
+            }
+            usages = [retried.get(usage.dataset_id, usage) for usage in usages]
+        
+        if on_usage is not None:
+            for usage in usages:
+                if usage.status != STATUS_OK:
+                    on_usage(usage)
+        
+        return self.storage_analyzer.compile_storage_summary(usages, time.monotonic() - started_at)
+    
+    def _collect_queries(self, query_jobs: Dict[str, Any], deadline: RunDeadline,
+                         on_user: Optional[Callable[[Dict[str, Any], Optional[str]], None]] = None) -> Dict[str, Any]:
+        """リージョン毎の投入済みクエリを並列に集計し、ユーザー別に統合（on_userは単一リージョンの場合のみ使用）"""
+        if len(query_jobs) == 1:
+            region, query_job = next(iter(query_jobs.items()))
+            return self._collect_region_query(region, query_job, deadline, on_user)
+        
+        with ThreadPoolExecutor(max_workers=len(query_jobs)) as executor:
+            futures = {
+                region: executor.submit(self._collect_region_query, region, query_job, deadline)
+                for region, query_job in query_jobs.items()
+            }
+            # 各リージョンの集計は内部でエラーを結果に変換するため、ここでは例外にならない
+            region_summaries = {region: future.result() for region, future in futures.items()}
+        return self.query_analyzer.merge_region_summaries(region_summaries)
+    
+    def _collect_region_query(self, region: str, query_job: Any, deadline: RunDeadline,
+                              on_user: Optional[Callable[[Dict[str, Any], Optional[str]], None]] = None) -> Dict[str, Any]:
+        """1リージョンのクエリ使用量を集計し、期限内であれば失敗時に再試行"""
+        query_analyzer = self.query_analyzers[region]
+        written_count = 0
+        if on_user is not None:
+            def write_user(user: Dict[str, Any], window: Optional[str] = None) -> None:
+                nonlocal written_count
+                written_count += 1
+                on_user(user, window)
+        else:
+            write_user = None
+        query_results = query_analyzer.collect_recent_queries(query_job, deadline, write_user)
+        for _ in range(self.retry_failed_rounds):
+            if query_results["complete"] or deadline.expired():
+                break
+            if written_count:
+                # 書き込み済みのユーザーが重複しないよう、途中まで書き込んだ後の失敗は再試行しない
+                print(f"ユーザーの書き込み後に失敗したためクエリ使用量の取得を再試行しません（{region}）",
+                      file=sys.stderr, flush=True)
+                break
+            print(f"クエリ使用量の取得を再試行（{region}）", file=sys.stderr, flush=True)
+            query_results = query_analyzer.analyze_recent_queries(deadline, write_user)
+        return query_results
+    
+    def _build_meta(self, storage_results: Dict[str, Any], query_results: Dict[str, Any]) -> Dict[str, Any]:
+        """レポートの_meta項目を作成"""
+        meta = {
+            "complete": storage_results["complete"] and query_results["complete"],
+        }
+        self._attach_instrumentation(meta)
+        return meta
+    
+    def _attach_instrumentation(self, meta: Dict[str, Any]) -> None:
+        """計測が有効な場合は計測値を_meta項目に追加し、計測ファイルにも追記"""
+        if self.instrumentation is not None:
+            instrumentation_snapshot = self.instrumentation.snapshot()
+            if self.metrics_file:
+                UsageReporter.append_metrics_file(self.metrics_file, instrumentation_snapshot)
+            meta["instrumentation"] = instrumentation_snapshot
+    
+    def refresh_storage(self) -> None:
+        """ストレージ使用量を再取得"""
+        deadline = RunDeadline(self.deadline_seconds)
+        self._bind_deadline(self.storage_analyzer, deadline)
+        storage_results = self._analyze_storage(deadline)
+        self._record_history(storage_results=storage_results)
+        with self._lock:
+            self._storage_results = storage_results
+        self._publish()
+    
+    def refresh_query(self) -> None:
+        """クエリ使用量を再取得"""
+        deadline = RunDeadline(self.deadline_seconds)
+        for query_analyzer in self.query_analyzers.values():
+            self._bind_deadline(query_analyzer, deadline)
+        query_jobs = {
+            region: query_analyzer.submit_recent_queries() for region, query_analyzer in self.query_analyzers.items()
+        }
+        query_results = self._collect_queries(query_jobs, deadline)
+        self._record_history(query_results=query_results)
+        with self._lock:
+            self._query_results = query_results
+        self._publish()
+    
+    def latest_report(self) -> Optional[Dict[str, Any]]:
+        """最新のレポートを取得（未取得の項目がある場合はNone）"""
+        with self._lock:
+            if self._storage_results is None or self._query_results is None:
+                return None
+            storage_results, query_results = self._storage_results, self._query_results
+        return UsageReporter.generate_report(storage_results, query_results,
+                                             self._build_meta(storage_results, query_results))
+    
+    def _publish(self) -> None:
+        """最新のレポートを出力"""
+        report = self.latest_report()
+        if report is not None:
+            if self.exporter is not None:
+                self.exporter.update(report)
+            UsageReporter.output_report(report, self.output_format)
+    
+    def run_forever(self) -> None:
+        """ストレージとクエリの取得をそれぞれの間隔で繰り返し実行"""
+        daemon_config = self.config.get("daemon", {})
+        workers = [
+            threading.Thread(
+                target=self._run_periodically,
+                args=(self.refresh_storage,
+                      daemon_config.get("storage_interval_seconds", self.DEFAULT_STORAGE_INTERVAL_SECONDS)),
+                name="storage-collector",
+            ),
+            threading.Thread(
+                target=self._run_periodically,
+                args=(self.refresh_query,
+                      daemon_config.get("query_interval_seconds", self.DEFAULT_QUERY_INTERVAL_SECONDS)),
+                name="query-collector",
+            ),
+        ]
+        if self.exporter is not None:
+            self.exporter.start()
+        for worker in workers:
+            worker.start()
+        
+        while not self._stop_event.wait(1.0):
+            pass
+        
+        for worker in workers:
+            worker.join()
+        if self.exporter is not None:
+            self.exporter.shutdown()
+    
+    def stop(self) -> None:
+        """常駐実行の停止を要求"""
+        self._stop_event.set()
+    
+    def _run_periodically(self, task, interval_seconds: float) -> None:
+        """停止要求があるまで一定間隔でタスクを実行"""
+        while not self._stop_event.is_set():
+            started_at = time.monotonic()
+            try:
+                task()
+            except (Exception, SystemExit) as error:
+                print(f"定期実行でエラーが発生: {error}", file=sys.stderr, flush=True)
+                print(traceback.format_exc(), file=sys.stderr, flush=True)
+            self._stop_event.wait(max(0.0, started_at + interval_seconds - time.monotonic()))
+
+
+class ProjectFanout:
+    """複数プロジェクトの使用量取得（プロジェクト毎にクライアントと監視サービスを分けてプールで並列実行）"""
+    
+    DEFAULT_MAX_WORKERS = 8
+    
+    def __init__(self, config: Dict[str, Any]):
+        fanout_config = config.get("fanout", {})
+        self.executor_kind = fanout_config.get("executor", "thread")
+        self.max_workers = fanout_config.get("max_workers", self.DEFAULT_MAX_WORKERS)
+        self.project_configs = ConfigurationManager.expand_projects(config)
+    
+    def collect(self, writer: Optional[NdjsonReportWriter] = None) -> Dict[str, Any]:
+        """
+        全プロジェクトの使用量を取得して統合レポートを生成（失敗したプロジェクトは他に影響させない）
+        writerを指定した場合は、プロジェクト毎のレポートを完了した順に書き込む
+        """
+        started_at = time.monotonic()
+        project_reports = {}
+        errors = []
+        
+        # processではプロジェクト毎の処理がプロセスで分離され、1プロセスの異常終了が他に波及しない
+        executor_class = ProcessPoolExecutor if self.executor_kind == "process" else ThreadPoolExecutor
+        with executor_class(max_workers=min(self.max_workers, len(self.project_configs))) as executor:
+            futures = {
+                executor.submit(collect_project_report, project_config): project_config["project_id"]
+                for project_config in self.project_configs
+            }
+            for future in as_completed(futures):
+                project_id = futures[future]
+                try:
+                    project_reports[project_id] = future.result()
+                    if writer is not None:
+                        writer.write_report(project_reports[project_id], project_id)
+                except KeyboardInterrupt:
+                    raise
+                except BaseException as error:
+                    # 認証失敗時のsys.exit(102)なども、そのプロジェクトの失敗として扱う
+                    print(f"プロジェクト {project_id} の取得でエラーが発生: {error!r}", file=sys.stderr, flush=True)
+                    errors.append(UnitError(f"project:{project_id}", "collect", STATUS_ERROR, repr(error)).to_dict())
+        
+        ordered_reports = {
+            project_config["project_id"]: project_reports[project_config["project_id"]]
+            for project_config in self.project_configs if project_config["project_id"] in project_reports
+        }
+        merged_report = UsageReporter.merge_project_reports(ordered_reports, errors, time.monotonic() - started_at)
+        if writer is not None:
+            writer.write_summary(merged_report)
+        return merged_report
+
+
+def create_service(config: Dict[str, Any]) -> MonitoringService:
+    """設定からBigQueryクライアントと監視サービスを生成"""
     bq_client = BigQueryClientFactory.create_client(
         config["key_file"], 
         config["project_id"]
     )
+    return MonitoringService(config, bq_client)
+
+
+def collect_project_report(project_config: Dict[str, Any]) -> Dict[str, Any]:
+    """1プロジェクト分の使用量を取得（プロセスプールからも呼び出せるようモジュール直下に定義）"""
+    return create_service(project_config).collect_once()
+
+
+def execute_monitoring(config_path: str = "settings.json", output_format: str = "json"):
+    """メイン実行フロー"""
+    # 設定の読み込み
+    config = ConfigurationManager.load_config(config_path)
+    ReportSerializer.ensure_available(output_format)
+    # ndjsonでは全体のレポートを組み立てずに、レコードを算出され次第書き出す
+    writer = NdjsonReportWriter() if output_format == "ndjson" else None
+    if "projects" in config:
+        merged_report = ProjectFanout(config).collect(writer)
+        if writer is None:
+            UsageReporter.output_report(merged_report, output_format)
+        return
     
-    # ストレージ使用量の分析
-    storage_analyzer = StorageAnalyzer(bq_client, config["project_id"])
-    storage_results = storage_analyzer.analyze_datasets(config["datasets"])
+    # BigQueryクライアントの初期化と使用量の取得
+    service = create_service(config)
+    final_report = service.collect_once(writer)
     
-    # クエリ使用量の分析
-    query_analyzer = QueryAnalyzer(bq_client, config["project_id"], config["region"])
-    query_results = query_analyzer.analyze_recent_queries()
+    # レポート出力
+    if writer is None:
+        UsageReporter.output_report(final_report, output_format)
+
+
+def execute_daemon(config_path: str = "settings.json", metrics_port: Optional[int] = None,
+                   project_id: Optional[str] = None, output_format: str = "json"):
+    """常駐実行フロー（クライアントを保持したまま定期的に取得）"""
+    config = ConfigurationManager.load_project_config(config_path, project_id)
+    if metrics_port is not None:
+        config.setdefault("exporter", {})["port"] = metrics_port
+    if config.get("organization", {}).get("enabled"):
+        print("設定エラー: 組織モード（organization.enabled）は常駐実行に対応していません", file=sys.stderr, flush=True)
+        sys.exit(101)
+    if output_format in ReportSerializer.ARROW_FORMATS:
+        # 出力毎のレポートを1つのストリームに連結できないため
+        print(f"設定エラー: --format {output_format}は常駐実行に対応していません", file=sys.stderr, flush=True)
+        sys.exit(101)
+    service = create_service(config)
+    service.output_format = output_format
+    
+    # SIGTERM/SIGINTで停止
+    signal.signal(signal.SIGTERM, lambda signum, frame: service.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: service.stop())
+    
+    service.run_forever()
+
+
+def execute_backfill(config_path: str = "settings.json", days: Optional[int] = None,
+                     project_id: Optional[str] = None):
+    """日別使用量の再構築フロー"""
+    config = ConfigurationManager.load_project_config(config_path, project_id)
+    if days is not None and not 1 <= days <= QueryAnalyzer.JOBS_RETENTION_DAYS:
+        print(f"設定エラー: --backfill-daysは1〜{QueryAnalyzer.JOBS_RETENTION_DAYS}で指定してください: {days}",
+              file=sys.stderr, flush=True)
+        sys.exit(101)
+    service = create_service(config)
+    UsageReporter.output_report(service.backfill(days))
+
+
+def execute_history(config_path: str, kind: str, since: Optional[str] = None, until: Optional[str] = None,
+                    key: Optional[str] = None, project_id: Optional[str] = None, region: Optional[str] = None):
+    """履歴の期間読み出しフロー（BigQueryには接続しない）"""
+    config = ConfigurationManager.load_project_config(config_path, project_id)
+    history_store = HistoryStore.from_config(config.get("history", {}))
+    
+    # クエリ履歴はリージョン毎に記録されるため、指定がない場合は設定した全リージョンから読み出す
+    query_regions = config.get("query", {}).get("regions", [config["region"]])
+    if region is not None and region not in query_regions:
+        print(f"設定エラー: --regionにはquery.regions（省略時はregion）のリージョンを指定してください: {region}",
+              file=sys.stderr, flush=True)
+        sys.exit(101)
+    regions = [region] if region is not None else query_regions
+    
+    try:
+        end_time = datetime.fromisoformat(until) if until else datetime.utcnow()
+        start_time = datetime.fromisoformat(since) if since else end_time - timedelta(days=7)
+    except ValueError as error:
+        print(f"設定エラー: --since/--untilはISO 8601形式で指定してください: {error}", file=sys.stderr, flush=True)
+        sys.exit(101)
+    # タイムゾーン付きで指定された場合はUTCに変換し、タイムゾーンなしの値として扱う
+    if end_time.tzinfo is not None:
+        end_time = end_time.astimezone(timezone.utc).replace(tzinfo=None)
+    if start_time.tzinfo is not None:
+        start_time = start_time.astimezone(timezone.utc).replace(tzinfo=None)
+    # 終端を含めないため、終了時刻の指定がない場合は現在の秒までを読み出す
+    start = int(QueryAnalyzer._to_epoch_seconds(start_time))
+    end = int(QueryAnalyzer._to_epoch_seconds(end_time)) + (0 if until else 1)
+    
+    if kind == "query-daily":
+        # --backfillで再構築した日別使用量（日の合計値のため階層の選択・集約は行わない）
+        UsageReporter.output_report({
+            "project_id": config["project_id"],
+            "kind": kind,
+            "since": start_time.isoformat(),
+            "until": end_time.isoformat(),
+            "tier": "daily",
+            "regions": regions,
+            "records": sorted((
+                {
+                    "timestamp": datetime.utcfromtimestamp(day_start).isoformat(),
+                    "region": query_region,
+                    "user_email": user_email,
+                    "bytes_processed": bytes_processed,
+                    "job_count": job_count,
+                }
+                for query_region in regions
+                for day_start, user_email, bytes_processed, job_count
+                in history_store.read_daily_usage(config["project_id"], query_region, start, end, key)
+            ), key=lambda record: record["timestamp"]),
+        })
+        return
+    
+    # 期間に応じた階層（raw/hourly/daily/monthly）から読み出す。集約済みの値は区間内の平均と最大
+    if kind == "storage":
+        key_name, value_name = "dataset_id", "size_bytes"
+        region_rows = {None: history_store.read_storage_series(config["project_id"], start, end, key)}
+    else:
+        key_name, value_name = "user_email", "bytes_processed"
+        window = QueryAnalyzer.select_primary_window(config.get("query", {}).get("windows", QueryAnalyzer.DEFAULT_WINDOWS))
+        region_rows = {
+            query_region: history_store.read_query_series(config["project_id"], query_region, window, start, end, key)
+            for query_region in regions
+        }
     
-    # レポート生成と出力
-    final_report = UsageReporter.generate_report(storage_results, query_results)
-    UsageReporter.output_report(final_report)
+    records = []
+    for query_region, rows in region_rows.items():
+        for ts, row_key, average_bytes, max_bytes, sample_count, tier in rows:
+            record = {"timestamp": datetime.utcfromtimestamp(ts).isoformat(), "tier": tier}
+            if query_region is not None:
+                record["region"] = query_region
+            record.update({
+                key_name: row_key,
+                value_name: round(average_bytes),
+                f"max_{value_name}": max_bytes,
+                "samples": sample_count,
+            })
+            records.append(record)
+    
+    report = {
+        "project_id": config["project_id"],
+        "kind": kind,
+        "since": start_time.isoformat(),
+        "until": end_time.isoformat(),
+        "tier": history_store.select_tier(start, end),
+    }
+    if kind != "storage":
+        report["regions"] = regions
+    # 複数リージョンの場合も時刻順に並べる（同時刻ではリージョンの指定順）
+    report["records"] = sorted(records, key=lambda record: record["timestamp"])
+    UsageReporter.output_report(report)
+
+
+def execute_compact(config_path: str = "settings.json", project_id: Optional[str] = None):
+    """履歴の集約と保持期間の適用フロー（BigQueryには接続しない）"""
+    config = ConfigurationManager.load_project_config(config_path, project_id)
+    history_store = HistoryStore.from_config(config.get("history", {}))
+    UsageReporter.output_report({
+        "project_id": config["project_id"],
+        "compaction": history_store.compact(config["project_id"]),
+    })
+
+
+def execute_validate_config(config_path: str = "settings.json"):
+    """設定ファイルの検証のみを実行"""
+    ConfigurationManager.load_config(config_path)
+    print(f"設定ファイルの検証に成功しました: {config_path}", flush=True)
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description="BigQuery使用量取得システム")
+    parser.add_argument("--config", default="settings.json", help="設定ファイルのパス（デフォルト: settings.json）")
+    parser.add_argument("--daemon", action="store_true", help="常駐して定期的に使用量を取得・出力する")
+    parser.add_argument("--validate-config", action="store_true",
+                        help="設定ファイルの検証のみを行う（BigQueryには接続しない）")
+    parser.add_argument("--metrics-port", type=int, help="常駐モードで/metricsを公開するポート（exporter.portより優先）")
+    parser.add_argument("--backfill", action="store_true",
+                        help="JOBSビューの保持期間内の日別・ユーザー別使用量を履歴に再構築する")
+    parser.add_argument("--backfill-days", type=int,
+                        help="再構築する日数（history.backfill_daysより優先、デフォルト: 180）")
+    parser.add_argument("--history", choices=["storage", "query", "query-daily"],
+                        help="記録済みの履歴を期間指定で読み出す（BigQueryには接続しない）")
+    parser.add_argument("--since", help="履歴の読み出し開始時刻（ISO 8601形式、タイムゾーン省略時はUTC、デフォルト: 7日前）")
+    parser.add_argument("--until", help="履歴の読み出し終了時刻（ISO 8601形式、タイムゾーン省略時はUTC、デフォルト: 現在）")
+    parser.add_argument("--key", help="履歴を絞り込むデータセット名（storage）またはメールアドレス（query）")
+    parser.add_argument("--region",
+                        help="クエリ履歴（query/query-daily）を読み出すリージョン（デフォルト: query.regionsの全リージョン）")
+    parser.add_argument("--project",
+                        help="projectsを設定した場合に--daemon/--backfill/--history/--compactの対象とするプロジェクト")
+    parser.add_argument("--compact", action="store_true",
+                        help="履歴を時間・日・月単位に集約し、保持期間を過ぎた値を削除する（BigQueryには接続しない）")
+    parser.add_argument("--format", choices=ReportSerializer.FORMATS, default="json",
+                        help="使用量レポートの出力形式（ndjsonは1レコード1行で算出され次第出力、"
+                             "arrow/parquetはpyarrowが必要、デフォルト: json）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    """エントリーポイント"""
+    args = parse_arguments(argv)
+    if args.validate_config:
+        execute_validate_config(args.config)
+    elif args.compact:
+        execute_compact(args.config, args.project)
+    elif args.history:
+        execute_history(args.config, args.history, args.since, args.until, args.key, args.project, args.region)
+    elif args.backfill:
+        execute_backfill(args.config, args.backfill_days, args.project)
+    elif args.daemon:
+        execute_daemon(args.config, args.metrics_port, args.project, args.format)
+    else:
+        execute_monitoring(args.config, args.format)
 
 
 if __name__ == "__main__":
-    execute_monitoring()
\ No newline at end of file
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+履歴読み出しベンチマーク
+合成したスナップショット（1時間毎 × 日数 × データセット数・ユーザー数）を履歴ファイルに書き込み、
+期間指定の読み出しと、集約（時間・日・月単位）後の階層を選択した読み出しにかかる時間を計測する
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import main  # noqa: E402
+
+PROJECT_ID = "benchmark-project"
+REGION = "us"
+WINDOW = "24h"
+HOUR_SECONDS = 3600
+
+
+def populate(history_store: main.HistoryStore, days: int, datasets: int, users: int, end: int) -> None:
+    """1時間毎のスナップショットを書き込む"""
+    dataset_ids = [f"dataset_{index:05d}" for index in range(datasets)]
+    user_emails = [f"user{index:05d}@example.com" for index in range(users)]
+    for hour in range(days * 24):
+        ts = end - (days * 24 - hour) * HOUR_SECONDS
+        history_store.append_storage(PROJECT_ID, ts, [(dataset_id, hour * 1024) for dataset_id in dataset_ids])
+        history_store.append_query(PROJECT_ID, REGION, WINDOW, ts, [(email, hour * 1024) for email in user_emails])
+
+
+def measure(label: str, runs: int, task) -> float:
+    """読み出しを繰り返し実行して中央値（ミリ秒）を表示"""
+    timings = []
+    row_count = 0
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        row_count = len(task())
+        timings.append((time.perf_counter() - started_at) * 1000)
+    median_ms = statistics.median(timings)
+    print(f"{label:<40} {row_count:>10} 行 {median_ms:>10.3f} ms", flush=True)
+    return median_ms
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="履歴読み出しのベンチマーク")
+    parser.add_argument("--days", type=int, default=30, help="スナップショットの日数（デフォルト: 30）")
+    parser.add_argument("--datasets", type=int, default=100, help="データセット数（デフォルト: 100）")
+    parser.add_argument("--users", type=int, default=100, help="ユーザー数（デフォルト: 100）")
+    parser.add_argument("--runs", type=int, default=5, help="読み出しの計測回数（デフォルト: 5）")
+    parser.add_argument("--max-ms", type=float, help="読み出し時間の中央値の許容上限（ミリ秒、省略時は判定しない）")
+    args = parser.parse_args()
+
+    end = int(time.time()) // HOUR_SECONDS * HOUR_SECONDS
+    with tempfile.TemporaryDirectory() as work_dir:
+        history_store = main.HistoryStore(str(Path(work_dir) / "history.sqlite3"))
+        started_at = time.perf_counter()
+        populate(history_store, args.days, args.datasets, args.users, end)
+        print(f"書き込み: {args.days * 24} スナップショット "
+              f"({args.datasets} データセット / {args.users} ユーザー) {time.perf_counter() - started_at:.2f}秒",
+              flush=True)
+
+        start = end - args.days * 86400
+        results = [
+            measure("1データセットの全期間", args.runs,
+                    lambda: history_store.read_storage(PROJECT_ID, start, end, "dataset_00000")),
+            measure("全データセットの直近1日", args.runs,
+                    lambda: history_store.read_storage(PROJECT_ID, end - 86400, end)),
+            measure("1ユーザーの全期間", args.runs,
+                    lambda: history_store.read_query(PROJECT_ID, REGION, WINDOW, start, end, "user00000@example.com")),
+            measure("全ユーザーの直近1日", args.runs,
+                    lambda: history_store.read_query(PROJECT_ID, REGION, WINDOW, end - 86400, end)),
+        ]
+
+        started_at = time.perf_counter()
+        history_store.compact(PROJECT_ID, now=end)
+        print(f"集約: {time.perf_counter() - started_at:.2f}秒", flush=True)
+        results += [
+            measure(f"1データセットの全期間（{history_store.select_tier(start, end, now=end)}）", args.runs,
+                    lambda: history_store.read_storage_series(PROJECT_ID, start, end, "dataset_00000", now=end)),
+            measure(f"全データセットの全期間（{history_store.select_tier(start, end, now=end)}）", args.runs,
+                    lambda: history_store.read_storage_series(PROJECT_ID, start, end, now=end)),
+            measure(f"全ユーザーの全期間（{history_store.select_tier(start, end, now=end)}）", args.runs,
+                    lambda: history_store.read_query_series(PROJECT_ID, REGION, WINDOW, start, end, now=end)),
+        ]
+
+    if args.max_ms is not None and max(results) > args.max_ms:
+        print(f"エラー: 読み出し時間の中央値が上限 {args.max_ms:.3f}ms を超えています", file=sys.stderr, flush=True)
+        sys.exit(102)
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+レポート出力ベンチマーク
+合成したレポート（データセット数・ユーザー数を指定）を出力形式毎にシリアライズし、
+変換にかかる時間と出力サイズ、受け側でのJSONの読み込み時間を計測する
+"""
+
+import argparse
+import io
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import main  # noqa: E402
+from fake_bigquery import make_synthetic_datasets, make_synthetic_users  # noqa: E402
+
+PROJECT_ID = "benchmark-project"
+REGION = "us"
+
+
+def build_report(datasets: int, users: int) -> dict:
+    """合成データからレポートを作成"""
+    storage_analyzer = main.StorageAnalyzer(None, PROJECT_ID, REGION)
+    query_analyzer = main.QueryAnalyzer(None, PROJECT_ID, REGION)
+    dataset_usages = [
+        storage_analyzer._calculate_dataset_costs(dataset_id, sum(table_sizes))
+        for dataset_id, table_sizes in make_synthetic_datasets(datasets * 10, datasets).items()
+    ]
+    user_totals = sorted(make_synthetic_users(users).items(), key=lambda item: item[1], reverse=True)
+    return main.UsageReporter.generate_report(
+        storage_analyzer.compile_storage_summary(dataset_usages),
+        query_analyzer._summarize_user_bytes(user_totals),
+        {"complete": True},
+    )
+
+
+def measure(label: str, runs: int, task, unit: str = "バイト") -> None:
+    """処理を繰り返し実行して中央値（ミリ秒）と結果の大きさ（出力サイズ・件数）を表示"""
+    timings = []
+    result_size = 0
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        result_size = task()
+        timings.append((time.perf_counter() - started_at) * 1000)
+    print(f"{label:<28} {result_size:>12} {unit} {statistics.median(timings):>10.3f} ms", flush=True)
+
+
+def write_format(report: dict, output_format: str) -> int:
+    """1形式分の出力を行い、出力サイズを返す"""
+    if output_format in main.ReportSerializer.ARROW_FORMATS:
+        sink = io.BytesIO()
+        main.ReportSerializer.write(report, output_format, sink)
+        return len(sink.getvalue())
+    sink = io.StringIO()
+    if output_format == "ndjson":
+        main.NdjsonReportWriter(sink).write_report(report)
+    else:
+        main.ReportSerializer.write(report, output_format, sink)
+    return len(sink.getvalue().encode("utf-8"))
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="レポート出力のベンチマーク")
+    parser.add_argument("--datasets", type=int, default=100, help="データセット数（デフォルト: 100）")
+    parser.add_argument("--users", type=int, default=50000, help="ユーザー数（デフォルト: 50000）")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数（デフォルト: 5）")
+    args = parser.parse_args()
+
+    report = build_report(args.datasets, args.users)
+    orjson_available = main.ReportSerializer._load_orjson() is not None
+    print(f"JSONの変換: {'orjson' if orjson_available else 'json（標準ライブラリ）'}", flush=True)
+
+    measure("json（標準ライブラリ）", args.runs,
+            lambda: len(json.dumps(report, ensure_ascii=False, indent=2).encode("utf-8")))
+    for output_format in main.ReportSerializer.FORMATS:
+        if output_format in main.ReportSerializer.ARROW_FORMATS:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                print(f"{output_format:<28} pyarrowが未インストールのためスキップ", flush=True)
+                continue
+        measure(output_format, args.runs, lambda: write_format(report, output_format))
+
+    pretty_output = main.ReportSerializer.dumps(report, pretty=True)
+    compact_output = main.ReportSerializer.dumps(report)
+    measure("読み込み: json", args.runs, lambda: len(json.loads(pretty_output)["query"]["users"]), "件")
+    measure("読み込み: json-compact", args.runs, lambda: len(json.loads(compact_output)["query"]["users"]), "件")
+
+
+if __name__ == "__main__":
+    main_benchmark()
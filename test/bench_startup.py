@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+起動時間ベンチマーク
+BigQueryに接続しないコマンド（--validate-config）の起動時間を計測し、
+google-cloud系ライブラリが読み込まれていないことを確認する
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 子プロセスで実行するコード（検証後にgoogle系モジュールの読み込み有無を確認）
+CHILD_CODE = """
+import sys
+import main
+main.main(["--validate-config", "--config", sys.argv[1]])
+loaded = sorted(name for name in sys.modules if name == "google" or name.startswith("google."))
+if loaded:
+    print("google系モジュールが読み込まれています: " + ", ".join(loaded), file=sys.stderr)
+    sys.exit(1)
+"""
+
+
+def measure_startup(config_path: str) -> float:
+    """1回分の起動から終了までの時間を計測"""
+    started_at = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD_CODE, config_path],
+        cwd=str(PROJECT_ROOT),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started_at
+    if completed.returncode != 0:
+        print(completed.stderr, file=sys.stderr, flush=True)
+        raise RuntimeError(f"--validate-configの実行に失敗しました（終了コード: {completed.returncode}）")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="--validate-configの起動時間ベンチマーク")
+    parser.add_argument("--config", default="settings.json.template", help="検証に使う設定ファイル")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数（デフォルト: 5）")
+    parser.add_argument("--max-seconds", type=float, default=1.0,
+                        help="中央値の許容上限（秒、デフォルト: 1.0）")
+    args = parser.parse_args()
+
+    try:
+        timings = [measure_startup(args.config) for _ in range(args.runs)]
+    except Exception as error:
+        print(f"ベンチマーク実行エラー: {error}", file=sys.stderr, flush=True)
+        sys.exit(101)
+
+    median_seconds = statistics.median(timings)
+    print(f"起動時間: 最小 {min(timings):.3f}秒 / 中央値 {median_seconds:.3f}秒 / 最大 {max(timings):.3f}秒"
+          f"（{args.runs}回）", flush=True)
+
+    if median_seconds > args.max_seconds:
+        print(f"エラー: 起動時間の中央値が上限 {args.max_seconds:.3f}秒 を超えています", file=sys.stderr, flush=True)
+        sys.exit(102)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+ストレージ・クエリ分析のベンチマーク
+フェイクのBigQueryクライアントに合成データセットと遅延を設定し、
+取得方式ごとの実行時間とAPI呼び出し回数を計測する
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import main  # noqa: E402
+from fake_bigquery import (  # noqa: E402
+    FakeBigQueryClient, FakeQueryJobConfigFactory, make_synthetic_datasets, make_synthetic_users
+)
+
+PROJECT_ID = "benchmark-project"
+REGION = "us"
+# google-cloud-bigqueryがなくても全方式を計測・比較できるよう、クエリジョブ設定はフェイクで生成する
+JOB_CONFIG_FACTORY = FakeQueryJobConfigFactory()
+
+# 取得方式ごとのstorage設定
+STORAGE_STRATEGIES = {
+    "per_table_serial": {"engine": "per_table", "max_workers": 1, "max_concurrent_datasets": 1},
+    "per_table_concurrent": {"engine": "per_table", "max_workers": 32, "max_concurrent_datasets": 4},
+    "per_table_cached": {"engine": "per_table", "max_workers": 32, "max_concurrent_datasets": 4},
+    "table_storage": {"engine": "table_storage"},
+}
+
+
+def build_client(args: argparse.Namespace, total_tables: int) -> FakeBigQueryClient:
+    """ベンチマーク用のフェイククライアントを生成"""
+    latency_seconds = args.latency_ms / 1000.0
+    return FakeBigQueryClient(
+        PROJECT_ID,
+        make_synthetic_datasets(total_tables, args.datasets),
+        make_synthetic_users(args.users),
+        latency={
+            "get_dataset": latency_seconds,
+            "list_tables": latency_seconds,
+            "get_table": latency_seconds,
+            "query": latency_seconds,
+            "query_result": args.query_wait_ms / 1000.0,
+        },
+    )
+
+
+def run_strategy(strategy: str, args: argparse.Namespace, total_tables: int, work_dir: Path) -> Dict[str, Any]:
+    """1つの取得方式を実行して計測結果を返す"""
+    client = build_client(args, total_tables)
+    dataset_list = sorted(make_synthetic_datasets(0, args.datasets).keys())
+
+    if strategy in STORAGE_STRATEGIES:
+        storage_config = dict(STORAGE_STRATEGIES[strategy])
+        if strategy == "per_table_cached":
+            storage_config["cache_file"] = str(work_dir / f"storage_cache_{total_tables}.sqlite3")
+            # 1回目でキャッシュを作成し、2回目（定常状態）を計測する
+            main.StorageAnalyzer(client, PROJECT_ID, REGION, storage_config, JOB_CONFIG_FACTORY).analyze_datasets(dataset_list)
+            client.call_counts.clear()
+        analyzer = main.StorageAnalyzer(client, PROJECT_ID, REGION, storage_config, JOB_CONFIG_FACTORY)
+        task = lambda: analyzer.analyze_datasets(dataset_list)  # noqa: E731
+    else:
+        query_config = {}
+        if strategy == "query_chunked":
+            # 7日間を1日単位の区間に分割して並列に走査する
+            query_config = {"windows": ["24h", "7d"], "max_concurrent_chunks": 8}
+        if strategy == "query_incremental":
+            query_config = {"incremental": True, "state_file": str(work_dir / f"query_state_{total_tables}.sqlite3")}
+            main.QueryAnalyzer(client, PROJECT_ID, REGION, query_config, job_config_factory=JOB_CONFIG_FACTORY).analyze_recent_queries()
+            client.call_counts.clear()
+        analyzer = main.QueryAnalyzer(client, PROJECT_ID, REGION, query_config, job_config_factory=JOB_CONFIG_FACTORY)
+        task = analyzer.analyze_recent_queries
+
+    started_at = time.perf_counter()
+    summary = task()
+    wall_seconds = time.perf_counter() - started_at
+
+    # 方式間で比較する集計結果（ストレージはデータセット別サイズ、クエリはユーザー別処理バイト数）
+    if strategy in STORAGE_STRATEGIES:
+        totals = {dataset["dataset_id"]: dataset["size_bytes"] for dataset in summary["datasets"]}
+    else:
+        totals = {user["user_email"]: user["bytes_processed"] for user in summary["users"]}
+
+    return {
+        "strategy": strategy,
+        "tables": total_tables,
+        "wall_seconds": round(wall_seconds, 4),
+        "api_calls": dict(sorted(client.call_counts.items())),
+        "total_api_calls": sum(client.call_counts.values()),
+        "complete": summary["complete"],
+        "totals": totals,
+    }
+
+
+def find_mismatches(results: List[Dict[str, Any]]) -> List[str]:
+    """テーブル数毎に、ストレージ・クエリそれぞれ最初に計測した方式を基準として集計結果の不一致を検出"""
+    baselines = {}
+    mismatches = []
+    for result in results:
+        kind = "storage" if result["strategy"] in STORAGE_STRATEGIES else "query"
+        baseline = baselines.setdefault((result["tables"], kind), result)
+        if not result["complete"]:
+            mismatches.append(f"{result['strategy']}（{result['tables']}テーブル）の取得が完了していません")
+        elif result["totals"] != baseline["totals"]:
+            differing = sorted(
+                key for key in set(result["totals"]) | set(baseline["totals"])
+                if result["totals"].get(key) != baseline["totals"].get(key)
+            )
+            mismatches.append(
+                f"{result['strategy']}（{result['tables']}テーブル）の集計結果が{baseline['strategy']}と一致しません"
+                f"（{len(differing)} 件、例: {differing[0]}）"
+            )
+    return mismatches
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    """結果を表形式で出力"""
+    print(f"{'strategy':<22} {'tables':>8} {'wall(s)':>10} {'calls':>8}  breakdown", flush=True)
+    for result in results:
+        breakdown = ", ".join(f"{method}={count}" for method, count in result["api_calls"].items())
+        print(f"{result['strategy']:<22} {result['tables']:>8} {result['wall_seconds']:>10.4f} "
+              f"{result['total_api_calls']:>8}  {breakdown}", flush=True)
+
+
+def main_benchmark():
+    all_strategies = list(STORAGE_STRATEGIES) + ["query", "query_incremental", "query_chunked"]
+    parser = argparse.ArgumentParser(description="ストレージ・クエリ分析のベンチマーク")
+    parser.add_argument("--tables", default="10,1000,10000",
+                        help="合計テーブル数のリスト（カンマ区切り、例: 10,1000,10000,100000）")
+    parser.add_argument("--datasets", type=int, default=4, help="データセット数（デフォルト: 4）")
+    parser.add_argument("--users", type=int, default=1000, help="クエリ利用ユーザー数（デフォルト: 1000）")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="API呼び出し1回あたりの遅延（ミリ秒）")
+    parser.add_argument("--query-wait-ms", type=float, default=200.0, help="クエリジョブの完了待ち時間（ミリ秒）")
+    parser.add_argument("--strategies", default=",".join(all_strategies),
+                        help=f"計測する方式（カンマ区切り、選択肢: {', '.join(all_strategies)}）")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    args = parser.parse_args()
+
+    strategies = [strategy.strip() for strategy in args.strategies.split(",") if strategy.strip()]
+    unknown = [strategy for strategy in strategies if strategy not in all_strategies]
+    if unknown:
+        print(f"エラー: 不明な方式: {', '.join(unknown)}", file=sys.stderr, flush=True)
+        sys.exit(101)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for total_tables in [int(value) for value in args.tables.split(",")]:
+            for strategy in strategies:
+                results.append(run_strategy(strategy, args, total_tables, Path(work_dir)))
+
+    mismatches = find_mismatches(results)
+    for result in results:
+        result.pop("totals", None)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2), flush=True)
+    else:
+        print_table(results)
+
+    if mismatches:
+        for mismatch in mismatches:
+            print(f"エラー: {mismatch}", file=sys.stderr, flush=True)
+        sys.exit(102)
+
+
+if __name__ == "__main__":
+    main_benchmark()
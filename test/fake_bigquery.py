@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+BigQueryクライアントのフェイク
+StorageAnalyzer/QueryAnalyzerが使用するbigquery.Clientのメソッド
+（dataset, get_dataset, list_tables, get_table, query）とクエリジョブ設定の生成をプロセス内で再現し、
+API呼び出し回数の計測と疑似的な遅延の注入を行う
+"""
+
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class FakeDatasetReference:
+    """データセット参照"""
+
+    def __init__(self, project: str, dataset_id: str):
+        self.project = project
+        self.dataset_id = dataset_id
+
+
+class FakeTableReference:
+    """テーブル参照"""
+
+    def __init__(self, dataset_ref: FakeDatasetReference, table_id: str):
+        self.project = dataset_ref.project
+        self.dataset_id = dataset_ref.dataset_id
+        self.table_id = table_id
+
+
+class FakeTable:
+    """テーブル（list_tablesの要素とget_tableの結果を兼ねる）"""
+
+    def __init__(self, reference: FakeTableReference, num_bytes: Optional[int],
+                 created: datetime, modified: datetime):
+        self.reference = reference
+        self.table_id = reference.table_id
+        self.dataset_id = reference.dataset_id
+        self.num_bytes = num_bytes
+        self.created = created
+        self.modified = modified
+
+
+class FakeQueryJobConfigFactory:
+    """main.QueryJobConfigFactoryのフェイク（google-cloud-bigqueryなしでクエリパラメータを渡す）"""
+
+    def build(self, parameters: List[Any], **options) -> SimpleNamespace:
+        return SimpleNamespace(
+            query_parameters=[SimpleNamespace(name=name, type_=type_name, value=value)
+                              for name, type_name, value in parameters],
+            **options,
+        )
+
+
+class FakeQueryJob:
+    """クエリジョブ（投入から遅延分が経過するまでresult()が待機した後に行を返す）"""
+
+    def __init__(self, client: "FakeBigQueryClient", rows: List[Any], total_bytes_billed: int):
+        self._client = client
+        self._rows = rows
+        self.job_id = f"fake_job_{id(self)}"
+        self.total_bytes_billed = total_bytes_billed
+        # 実際のジョブと同様に、投入直後からサーバー側で実行されているものとして完了時刻を決める
+        self._done_at = time.monotonic() + client.latency.get("query_result", 0.0)
+
+    def result(self, timeout: Optional[float] = None, **kwargs) -> List[Any]:
+        remaining = self._done_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        return list(self._rows)
+
+
+class FakeBigQueryClient:
+    """bigquery.Clientのフェイク"""
+
+    # list_tablesの1ページあたりの件数
+    DEFAULT_PAGE_SIZE = 1000
+
+    def __init__(self, project: str, datasets: Dict[str, List[int]], users: Optional[Dict[str, int]] = None,
+                 latency: Optional[Dict[str, float]] = None, page_size: int = DEFAULT_PAGE_SIZE):
+        """
+        datasets: データセット名 → テーブルサイズ（バイト）のリスト
+        users: メールアドレス → 24時間の処理バイト数（各ユーザーのジョブは生成時刻の30分前に1件実行されたものとする）
+        latency: メソッド名 → 1回あたりの遅延秒数（list_tablesは1ページあたり、queryの待ち時間はquery_result）
+        """
+        self.project = project
+        self.users = users or {}
+        self.job_time = datetime.now(timezone.utc) - timedelta(minutes=30)
+        self.latency = latency or {}
+        self.page_size = page_size
+        self.call_counts = Counter()
+        self._lock = threading.Lock()
+
+        now = datetime.now(timezone.utc)
+        self._tables = {}
+        # get_tableの検索用（データセット名 → テーブル名 → テーブル）
+        self._table_index = {}
+        for dataset_id, table_sizes in datasets.items():
+            dataset_ref = FakeDatasetReference(project, dataset_id)
+            self._tables[dataset_id] = [
+                FakeTable(
+                    FakeTableReference(dataset_ref, f"table_{index:06d}"),
+                    num_bytes,
+                    now - timedelta(days=30),
+                    now - timedelta(hours=index % 48),
+                )
+                for index, num_bytes in enumerate(table_sizes)
+            ]
+            self._table_index[dataset_id] = {table.table_id: table for table in self._tables[dataset_id]}
+
+    def _record(self, method: str) -> None:
+        with self._lock:
+            self.call_counts[method] += 1
+        self._sleep(method)
+
+    def _sleep(self, method: str) -> None:
+        delay = self.latency.get(method, 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def dataset(self, dataset_id: str, project: Optional[str] = None) -> FakeDatasetReference:
+        return FakeDatasetReference(project or self.project, dataset_id)
+
+    def get_dataset(self, dataset_ref: FakeDatasetReference, **kwargs) -> FakeDatasetReference:
+        self._record("get_dataset")
+        if dataset_ref.dataset_id not in self._tables:
+            raise LookupError(f"Not found: Dataset {dataset_ref.project}:{dataset_ref.dataset_id}")
+        return dataset_ref
+
+    def list_tables(self, dataset_ref: FakeDatasetReference, **kwargs) -> Iterator[FakeTable]:
+        tables = self._tables.get(dataset_ref.dataset_id, [])
+        # 実際のAPIと同様にページ単位で取得する
+        for page_start in range(0, max(len(tables), 1), self.page_size):
+            self._record("list_tables")
+            for table in tables[page_start:page_start + self.page_size]:
+                yield table
+
+    def get_table(self, table_ref: FakeTableReference, **kwargs) -> FakeTable:
+        self._record("get_table")
+        table = self._table_index.get(table_ref.dataset_id, {}).get(table_ref.table_id)
+        if table is not None:
+            return table
+        raise LookupError(f"Not found: Table {table_ref.dataset_id}.{table_ref.table_id}")
+
+    def query(self, query: str, job_config: Any = None, **kwargs) -> FakeQueryJob:
+        self._record("query")
+        parameters = {
+            parameter.name: getattr(parameter, "values", getattr(parameter, "value", None))
+            for parameter in getattr(job_config, "query_parameters", None) or []
+        }
+
+        # 組織単位のビューでは、projectsの指定（省略時は自身のプロジェクト）毎に同じ行をproject_id付きで返す
+        organization_projects = None
+        if "BY_ORGANIZATION" in query:
+            organization_projects = parameters.get("projects") or [self.project]
+
+        # JOBSビューへのクエリは走査範囲（@range_start以上@range_end未満）にジョブの実行時刻が含まれる場合のみ行を返す
+        in_range = (parameters.get("range_start", self.job_time) <= self.job_time
+                    and ("range_end" not in parameters or self.job_time < parameters["range_end"]))
+
+        if "TABLE_STORAGE" in query:
+            rows = self._table_storage_rows(parameters.get("datasets"))
+        elif not in_range:
+            rows = []
+        elif "job_count" in query:
+            rows = [
+                SimpleNamespace(user_email=email, total_bytes_processed=bytes_processed, job_count=1)
+                for email, bytes_processed in self.users.items()
+            ]
+        elif "bucket_start" in query:
+            bucket_start = int(self.job_time.timestamp()) // 60 * 60
+            rows = [
+                SimpleNamespace(bucket_start=bucket_start, user_email=email, total_bytes_processed=bytes_processed)
+                for email, bytes_processed in self.users.items()
+            ]
+        else:
+            # 集計期間毎の列（bytes_w0, jobs_w0, ...）は期間の開始時刻（@start_wN）以降のジョブを集計する
+            window_count = len(set(re.findall(r"bytes_w(\d+)", query)))
+            rows = []
+            for email, bytes_processed in sorted(self.users.items(), key=lambda item: -item[1]):
+                row = SimpleNamespace(user_email=email, total_bytes_processed=bytes_processed)
+                for index in range(window_count):
+                    in_window = parameters.get(f"start_w{index}", self.job_time) <= self.job_time
+                    setattr(row, f"bytes_w{index}", bytes_processed if in_window else 0)
+                    setattr(row, f"jobs_w{index}", 1 if in_window else 0)
+                rows.append(row)
+        if organization_projects is not None:
+            rows = [
+                SimpleNamespace(project_id=project_id, **vars(row))
+                for project_id in organization_projects for row in rows
+            ]
+        return FakeQueryJob(self, rows, total_bytes_billed=10 * 1024 ** 2)
+
+    def _table_storage_rows(self, dataset_filter: Optional[List[str]]) -> List[Any]:
+        rows = []
+        for dataset_id, tables in self._tables.items():
+            if dataset_filter is not None and dataset_id not in dataset_filter:
+                continue
+            rows.append(SimpleNamespace(
+                dataset_id=dataset_id,
+                total_bytes=sum(table.num_bytes or 0 for table in tables),
+            ))
+        return rows
+
+
+def make_synthetic_datasets(total_tables: int, dataset_count: int = 4, seed: int = 0) -> Dict[str, List[int]]:
+    """合計total_tables件のテーブルをdataset_count個のデータセットに振り分けた合成データを生成"""
+    generator = random.Random(seed)
+    datasets = {}
+    for dataset_index in range(dataset_count):
+        table_count = total_tables // dataset_count + (1 if dataset_index < total_tables % dataset_count else 0)
+        datasets[f"dataset_{dataset_index:03d}"] = [
+            generator.randint(0, 10 * 1024 ** 3) for _ in range(table_count)
+        ]
+    return datasets
+
+
+def make_synthetic_users(user_count: int, seed: int = 0) -> Dict[str, int]:
+    """user_count人分のクエリ処理量を生成"""
+    generator = random.Random(seed)
+    return {
+        f"user{index:05d}@example.com": generator.randint(0, 5 * 1024 ** 4)
+        for index in range(user_count)
+    }
@@ -36,17 +36,47 @@ echo "main.py存在確認完了"
 
 # Pythonの文法チェック
 echo "3. Python文法チェック"
-python3 -m py_compile main.py
+python3 -m py_compile main.py test/bench_startup.py test/fake_bigquery.py test/benchmark.py test/bench_history.py test/bench_serialize.py
 if [ $? -ne 0 ]; then
     echo "エラー: main.pyに文法エラーがあります" >&2
     exit 103
 fi
 echo "Python文法チェック完了"
 
-# 引数なしの実行テスト（モジュールエラーを無視して引数エラーのテスト）
-echo "4. 引数エラーテスト"
-# google-cloudライブラリがないため、構文チェックのみでスキップ
-echo "引数エラーテスト（モジュールエラーによりスキップ）"
+# 設定検証テスト（google-cloudライブラリなしで実行可能）
+echo "4. 設定検証テスト"
+python3 main.py --validate-config --config settings.json
+if [ $? -ne 0 ]; then
+    echo "エラー: 設定ファイルの検証に失敗しました" >&2
+    exit 104
+fi
+echo '{"project_id": "your-project-id"}' > test_invalid_settings.json
+python3 main.py --validate-config --config test_invalid_settings.json > /dev/null 2>&1
+INVALID_STATUS=$?
+rm -f test_invalid_settings.json
+if [ ${INVALID_STATUS} -ne 101 ]; then
+    echo "エラー: 不正な設定ファイルが検出されませんでした（終了コード: ${INVALID_STATUS}）" >&2
+    exit 105
+fi
+echo "設定検証テスト完了"
+
+# 起動時間ベンチマーク
+echo "5. 起動時間ベンチマーク"
+python3 test/bench_startup.py --config settings.json
+if [ $? -ne 0 ]; then
+    echo "エラー: 起動時間ベンチマークに失敗しました" >&2
+    exit 106
+fi
+echo "起動時間ベンチマーク完了"
+
+# フェイククライアントによる分析処理テスト
+echo "6. 分析処理ベンチマーク（フェイククライアント）"
+python3 test/benchmark.py --tables 10,100 --latency-ms 0
+if [ $? -ne 0 ]; then
+    echo "エラー: 分析処理ベンチマークに失敗しました" >&2
+    exit 107
+fi
+echo "分析処理ベンチマーク完了"
 
 # テスト用ファイルクリーンアップ
 if [ -f "settings.json" ]; then